@@ -0,0 +1,53 @@
+import gzip
+import json
+import logging
+import os
+import threading
+import zlib
+
+logger = logging.getLogger(__name__)
+
+
+class TaskArchive:
+    """
+    Append-only архив решённых задач (task_archive.jsonl.gz).
+
+    Каждый проход архивации дописывает в файл отдельный gzip-член со строкой
+    JSON на задачу; gzip читает такие склеенные члены как один поток. Если
+    задача архивировалась несколько раз (её возвращали в работу), верна
+    последняя запись.
+    """
+
+    def __init__(self, path='task_archive.jsonl.gz'):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, records):
+        if not records:
+            return
+        with self._lock, open(self.path, 'ab') as raw:
+            with gzip.GzipFile(fileobj=raw, mode='wb') as f:
+                for record in records:
+                    f.write((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    def __iter__(self):
+        if not os.path.exists(self.path):
+            return
+        with self._lock:
+            try:
+                with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        yield json.loads(line)
+            except (EOFError, OSError, zlib.error, ValueError) as e:
+                # Оборванный последний член после сбоя: всё, что до него, цело
+                logger.warning(f"Archive {self.path} is truncated: {e}")
+
+    def find(self, task_number):
+        """Последняя архивная запись задачи или None."""
+        found = None
+        for record in self:
+            if record['task_number'] == task_number:
+                found = record
+        return found
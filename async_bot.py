@@ -0,0 +1,342 @@
+"""
+Асинхронный движок бота на AsyncTeleBot: те же обработчики и TaskState,
+что и в bot.py, но медленный вызов API не блокирует остальных пользователей.
+
+    python async_bot.py
+
+Требует aiohttp (зависимость AsyncTeleBot).
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from dotenv import load_dotenv
+from telebot import types, util
+from telebot.async_telebot import AsyncTeleBot
+from telebot.asyncio_handler_backends import BaseMiddleware
+
+from config import (SENDER_USER_IDS, INFO_CHAT_ID,
+                    DELIVERY_WORKERS, RATE_LIMIT_GLOBAL_PER_SECOND,
+                    RATE_LIMIT_PRIVATE_CHAT_PER_SECOND, RATE_LIMIT_GROUP_PER_MINUTE,
+                    RATE_LIMIT_MAX_RETRIES, EDIT_COALESCE_WINDOW, METRICS_HOST, METRICS_PORT,
+                    METRICS_DUMP_FILE, METRICS_DUMP_INTERVAL, ARCHIVE_INTERVAL_HOURS,
+                    REMINDER_MODE, DIGEST_INTERVAL_MINUTES, DRAFT_EXPIRE_INTERVAL_MINUTES,
+                    OUTBOX_FILE, OUTBOX_MAX_ATTEMPTS, OUTBOX_RETRY_BASE_SECONDS, OUTBOX_RETRY_MAX_SECONDS)
+from gateway import AsyncTelegramGateway, AsyncEditCoalescer, PRIORITY_BACKGROUND
+from metrics import (registry, instrument_handler, timed, finalize_latency,
+                     start_metrics_server, dump_metrics)
+from outbox import AsyncOutbox
+from tasks import (TaskState, ICON_COLOR, user_profiles, remember_user, format_user_name, field_prompt)
+
+load_dotenv()
+TOKEN = os.getenv("TOKEN")
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+bot = AsyncTeleBot(TOKEN)
+api = AsyncTelegramGateway(
+    bot,
+    global_rate=RATE_LIMIT_GLOBAL_PER_SECOND,
+    private_chat_rate=RATE_LIMIT_PRIVATE_CHAT_PER_SECOND,
+    group_rate_per_minute=RATE_LIMIT_GROUP_PER_MINUTE,
+    max_retries=RATE_LIMIT_MAX_RETRIES
+)
+outbox = AsyncOutbox(api, path=OUTBOX_FILE, workers=DELIVERY_WORKERS, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                     retry_base=OUTBOX_RETRY_BASE_SECONDS, retry_max=OUTBOX_RETRY_MAX_SECONDS)
+edit_coalescer = AsyncEditCoalescer(outbox, window=EDIT_COALESCE_WINDOW)
+scheduler = AsyncIOScheduler()
+registry.gauge('bot_scheduler_jobs', "Заданий в очереди планировщика", lambda: len(scheduler.get_jobs()))
+registry.gauge('bot_task_drafts', "Незавершённых черновиков задач", lambda: len(task_manager.drafts))
+registry.gauge('bot_outbox_depth', "Неотправленных вызовов в outbox", outbox.depth)
+registry.gauge('bot_outbox_oldest_age_seconds', "Возраст самого старого вызова в outbox", outbox.oldest_age)
+
+
+class AsyncTaskManager(TaskState):
+    @timed(finalize_latency)
+    async def finalize_task(self, chat_id, task_data):
+        try:
+            sender_name = format_user_name(await get_user_profile(chat_id, api.get_chat))
+        except Exception as e:
+            logger.error(f"Error getting sender info: {e}")
+            sender_name = "Неизвестный отправитель"
+
+        task_number, task_data = self.register_task(chat_id, task_data, sender_name)
+
+        # Подтверждение отправителю и сообщение в основной чат не зависят друг от друга
+        method_name, kwargs = self.main_chat_post(task_number, task_data)
+        confirm, main_msg = await asyncio.gather(
+            api.send_message(
+                chat_id,
+                f"✅ Задача #{task_number} успешно создана!",
+                reply_markup=types.ReplyKeyboardRemove()
+            ),
+            api.call(method_name, **kwargs),
+            return_exceptions=True
+        )
+        if isinstance(confirm, Exception):
+            logger.error(f"Error confirming task to sender: {confirm}")
+
+        try:
+            if isinstance(main_msg, Exception):
+                raise main_msg
+            self.set_main_chat_message(task_number, main_msg.message_id)
+
+            forum_topic = await api.create_forum_topic(
+                INFO_CHAT_ID,
+                self.topic_name(task_number, task_data, "🔴"),
+                icon_color=ICON_COLOR
+            )
+            thread_id = forum_topic.message_thread_id
+
+            method_name, kwargs = self.forum_post(task_number, task_data, thread_id)
+            forum_msg = await api.call(method_name, **kwargs)
+            self.publish(task_number, task_data, thread_id, forum_msg.message_id)
+
+        except Exception as e:
+            logger.error(f"Error finalizing task: {e}")
+            await api.send_message(chat_id, f"❌ Ошибка при публикации задачи #{task_number}.")
+
+    def _arm_timer(self, task_number, run_date):
+        scheduler.add_job(
+            run_task_timer,
+            'date',
+            run_date=run_date,
+            args=[task_number],
+            id=f"task_timer:{task_number}",
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+
+
+task_manager = AsyncTaskManager(outbox, edit_coalescer)
+
+
+async def get_user_profile(user_id, lookup):
+    """Профиль из кэша; lookup(user_id) вызывается только при промахе и должен вернуть User/Chat."""
+    profile = user_profiles.get(user_id)
+    if profile is None:
+        remember_user(await lookup(user_id))
+        profile = user_profiles.get(user_id)
+    return profile
+
+
+class RememberUserMiddleware(BaseMiddleware):
+    def __init__(self):
+        super().__init__()
+        self.update_types = ['message', 'callback_query']
+
+    async def pre_process(self, update, data):
+        if update.from_user:
+            remember_user(update.from_user)
+
+    async def post_process(self, update, data, exception):
+        pass
+
+
+bot.setup_middleware(RememberUserMiddleware())
+
+
+async def run_task_timer(task_number):
+    due = task_manager.due_timers(task_number)
+    task_manager.send_due(due, await unanswered_notices(due['notify_at']))
+    task_manager.schedule_timer(task_number)
+
+
+async def send_digests():
+    due = task_manager.collect_due_timers()
+    task_manager.send_due(due, await unanswered_notices(due['notify_at']))
+
+
+async def unanswered_notices(task_numbers):
+    return [(task_number, await unanswered_user_names(user_ids))
+            for task_number, user_ids in task_manager.unanswered_by_task(task_numbers)]
+
+
+async def unanswered_user_names(user_ids):
+    async def lookup(uid):
+        member = await api.get_chat_member(INFO_CHAT_ID, uid, priority=PRIORITY_BACKGROUND)
+        return member.user
+
+    profiles = await asyncio.gather(
+        *(get_user_profile(user_id, lookup) for user_id in user_ids),
+        return_exceptions=True)
+    names = []
+    for profile in profiles:
+        if isinstance(profile, Exception):
+            logger.error(f"Error getting user info: {profile}")
+        else:
+            names.append(format_user_name(profile, with_username=True))
+    return names
+
+
+@bot.message_handler(commands=['start'], chat_types=['private'])
+@instrument_handler
+async def start_handler(message):
+    if message.from_user.id in SENDER_USER_IDS:
+        keyboard = types.ReplyKeyboardMarkup(
+            resize_keyboard=True, one_time_keyboard=True)
+        keyboard.add(types.KeyboardButton("Создать задачу"))
+        await api.send_message(message.chat.id,
+                               "Привет! Нажмите кнопку, чтобы начать создание задачи.",
+                               reply_markup=keyboard)
+    else:
+        await api.send_message(message.chat.id,
+                               "Добро пожаловать! Здесь вы можете получать и принимать задачи.",
+                               reply_markup=types.ReplyKeyboardRemove())
+
+
+@bot.message_handler(commands=['find'],
+                     func=lambda m: m.chat.id == INFO_CHAT_ID or m.from_user.id in SENDER_USER_IDS)
+@instrument_handler
+async def find_handler(message):
+    await api.send_message(message.chat.id,
+                           task_manager.find_tasks(util.extract_arguments(message.text) or "", message.from_user.id),
+                           reply_to_message_id=message.message_id)
+
+
+@bot.message_handler(commands=['stats'],
+                     func=lambda m: m.chat.id == INFO_CHAT_ID or m.from_user.id in SENDER_USER_IDS)
+@instrument_handler
+async def stats_handler(message):
+    await api.send_message(message.chat.id,
+                           task_manager.stats_report(util.extract_arguments(message.text) or ""),
+                           reply_to_message_id=message.message_id)
+
+
+@bot.message_handler(func=lambda m: m.text == "Создать задачу" and m.from_user.id in SENDER_USER_IDS)
+@instrument_handler
+async def task_creation_handler(message):
+    task_manager.create_task(message.chat.id)
+    await api.send_message(message.chat.id, "Отправьте название клиента.")
+
+
+@bot.message_handler(content_types=['text', 'photo'], func=lambda m: m.from_user.id in SENDER_USER_IDS)
+@instrument_handler
+async def process_task_data(message):
+    chat_id = message.chat.id
+    step = task_manager.fill_draft(chat_id, message)
+    if step is None:
+        return
+
+    next_field, task_data = step
+    if next_field:
+        text, reply_markup = field_prompt(next_field)
+        await api.send_message(chat_id, text, reply_markup=reply_markup)
+    else:
+        await task_manager.finalize_task(chat_id, task_data)
+
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith(('forum_', 'user_', 'skip')))
+@instrument_handler
+async def callback_handler(call):
+    try:
+        if call.data == "skip_step":
+            await handle_skip_step(call)
+            return
+
+        parts = call.data.split(':', 1)
+        prefix_action = parts[0]
+        task_number = int(parts[1]) if len(parts) > 1 else None
+
+        if prefix_action.startswith('forum_'):
+            action = prefix_action.split('_', 1)[1]
+            await handle_forum_action(call, action, task_number)
+        elif prefix_action.startswith('user_'):
+            action = prefix_action.split('_', 1)[1]
+            await handle_user_response(call, action, task_number)
+
+    except Exception as e:
+        logger.error(f"Callback error: {e}")
+        await api.answer_callback_query(call.id, "Ошибка обработки запроса")
+
+
+async def handle_skip_step(call):
+    chat_id = call.message.chat.id
+    task_data = task_manager.skip_photo(chat_id)
+    if task_data is None:
+        return
+    await task_manager.finalize_task(chat_id, task_data)
+    await api.answer_callback_query(call.id, "Шаг с фото пропущен")
+    await api.edit_message_reply_markup(
+        chat_id, call.message.message_id, reply_markup=None)
+
+
+async def handle_forum_action(call, action, task_number):
+    try:
+        # «Вернуть в работу» может читать архив с диска — не в цикле событий
+        answer, calls = await asyncio.to_thread(task_manager.forum_action, task_number, action, call.from_user)
+        if calls is not None:
+            for method_name, kwargs in calls:
+                await api.call(method_name, **kwargs)
+            task_manager.forum_action_done(task_number, action)
+        await api.answer_callback_query(call.id, answer)
+
+    except Exception as e:
+        logger.error(f"Ошибка изменения темы: {e}")
+        await api.answer_callback_query(call.id, f"Ошибка: {str(e)}")
+
+
+async def handle_user_response(call, action, task_number):
+    status = task_manager.record_response(task_number, action, call.from_user)
+
+    if status:
+        try:
+            await api.edit_message_reply_markup(
+                chat_id=call.message.chat.id,
+                message_id=call.message.message_id,
+                reply_markup=None
+            )
+            await api.answer_callback_query(call.id, f"Статус обновлен: {status}")
+        except Exception as e:
+            logger.error(f"Error updating message: {e}")
+            await api.answer_callback_query(call.id, "Ошибка обновления!")
+
+
+async def reconcile_state():
+    # Проход по задачам — в потоке; правки тем ставятся из цикла, где живёт AsyncEditCoalescer
+    task_manager.repair_topics(await asyncio.to_thread(task_manager.reconcile))
+    scheduler.add_job(task_manager.archive_resolved, 'interval', hours=ARCHIVE_INTERVAL_HOURS,
+                      id='archive_resolved', replace_existing=True, next_run_time=datetime.now())
+
+
+async def main():
+    logger.info("Starting bot (async)...")
+    scheduler.start()
+    outbox.start()
+    scheduler.add_job(reconcile_state, 'date', run_date=datetime.now(), id='reconcile_state',
+                      replace_existing=True, misfire_grace_time=None)
+    scheduler.add_job(task_manager.expire_drafts, 'interval', minutes=DRAFT_EXPIRE_INTERVAL_MINUTES,
+                      id='expire_drafts', replace_existing=True)
+    if REMINDER_MODE == 'digest':
+        scheduler.add_job(send_digests, 'interval', minutes=DIGEST_INTERVAL_MINUTES,
+                          id='digest', replace_existing=True, next_run_time=datetime.now())
+    if METRICS_PORT:
+        start_metrics_server(METRICS_HOST, METRICS_PORT)
+    if METRICS_DUMP_FILE:
+        scheduler.add_job(dump_metrics, 'interval', seconds=METRICS_DUMP_INTERVAL,
+                          args=[METRICS_DUMP_FILE], id='metrics_dump', replace_existing=True)
+    try:
+        await bot.delete_webhook()
+        await bot.polling(non_stop=True)
+    finally:
+        scheduler.shutdown()
+        await edit_coalescer.flush()
+        await outbox.stop()
+        task_manager.save_state()
+        if METRICS_DUMP_FILE:
+            dump_metrics(METRICS_DUMP_FILE)
+        await bot.close_session()
+        logger.info("Bot stopped gracefully")
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,192 @@
+"""
+Сквозной нагрузочный прогон bot.py против локального FakeTelegramServer:
+мастер создания задачи (process_task_data), публикация задачи и шторм
+нажатий кнопок получателями и в форуме. Обновления доставляются через
+getUpdates, так что работает тот же polling, что и в боевом режиме.
+
+    python benchmarks/bench_e2e.py --tasks 24 --latency 0.02 --rate-limit 0.01
+
+Без --unthrottled действуют лимиты из config.py (1 сообщение/с в личный
+чат), и мастер упирается в них — это и есть поведение в проде.
+"""
+import argparse
+import itertools
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import RECEIVER_USER_IDS  # noqa: E402
+from fake_telegram import FakeTelegramServer  # noqa: E402
+
+WIZARD_ANSWERS = ["Клиент", "Срочно", "Настроить оборудование", "Запуск",
+                  "ПП", "Cisco 2960", "10000 / 4", "Иванов И.И."]
+
+callback_ids = itertools.count(1)
+
+
+def user(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': "User", 'last_name': str(user_id)}
+
+
+def message(user_id, text):
+    return {'message_id': 1, 'date': int(time.time()), 'text': text,
+            'chat': {'id': user_id, 'type': 'private'}, 'from': user(user_id)}
+
+
+def callback(user_id, data, chat_id=None):
+    """Возвращает (callback_query_id, payload)."""
+    query_id = str(next(callback_ids))
+    chat_id = chat_id or user_id
+    chat = {'id': chat_id, 'type': 'private' if chat_id > 0 else 'supergroup'}
+    return query_id, {'id': query_id, 'chat_instance': 'bench', 'data': data, 'from': user(user_id),
+                      'message': {'message_id': 1, 'date': int(time.time()), 'chat': chat}}
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def run_wizard(server, sender_id, tasks, timeout):
+    """Проводит отправителя через мастер tasks раз; каждую реплику шлёт после ответа бота."""
+    durations = []
+    for _ in range(tasks):
+        start = time.perf_counter()
+        for text in ["Создать задачу"] + WIZARD_ANSWERS:
+            sent = server.count_calls('sendMessage', sender_id)
+            server.push_update('message', message(sender_id, text))
+            if not server.wait_for(lambda s: s.count_calls('sendMessage', sender_id) > sent, timeout):
+                raise TimeoutError(f"no reply to {sender_id} for {text!r}")
+        # Шаг с фото пропускаем кнопкой; ответ на callback приходит после публикации задачи
+        query_id, payload = callback(sender_id, 'skip_step')
+        server.push_update('callback_query', payload)
+        if not server.wait_for(lambda s: query_id in s.callback_answers, timeout):
+            raise TimeoutError(f"task of {sender_id} was not finalized")
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_storm(server, bot_module, task_numbers, timeout):
+    """Все получатели одновременно отвечают на все задачи, плюс take/resolve в форуме."""
+    pushed = {}
+    for task_number in task_numbers:
+        for receiver_id in RECEIVER_USER_IDS:
+            action = random.choice(['take', 'no_competence', 'cant_take'])
+            query_id, payload = callback(receiver_id, f"user_{action}:{task_number}")
+            pushed[query_id] = time.perf_counter()
+            server.push_update('callback_query', payload)
+        for action in ('take', 'resolve'):
+            query_id, payload = callback(RECEIVER_USER_IDS[0], f"forum_{action}:{task_number}",
+                                         chat_id=bot_module.INFO_CHAT_ID)
+            pushed[query_id] = time.perf_counter()
+            server.push_update('callback_query', payload)
+
+    if not server.wait_for(lambda s: all(q in s.callback_answers for q in pushed), timeout):
+        raise TimeoutError("callback storm did not finish")
+    return [server.callback_answers[q] - pushed[q] for q in pushed]
+
+
+def report(title, server, tasks, elapsed):
+    total = sum(server.counts.values())
+    print(f"\n{title}: {elapsed:.2f}s, {total} API calls ({total / max(tasks, 1):.1f} per task), "
+          f"429 injected: {sum(server.rate_limited.values())}")
+    for method, count in server.counts.most_common():
+        print(f"  {method:<24} {count:>6}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tasks', type=int, default=24, help="Сколько задач создать")
+    parser.add_argument('--senders', type=int, default=4, help="Параллельных отправителей")
+    parser.add_argument('--latency', type=float, default=0.02, help="Задержка ответа API, с")
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument('--unthrottled', action='store_true',
+                        help="Снять лимиты TelegramGateway, чтобы мерить сам бот")
+    parser.add_argument('--timeout', type=float, default=120)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server = FakeTelegramServer(latency=args.latency, jitter=args.jitter,
+                                rate_limit_ratio=args.rate_limit, seed=1).start()
+
+    os.environ.setdefault('TOKEN', '123456:bench')
+    from telebot import apihelper
+    apihelper.API_URL = server.api_url
+    apihelper.RETRY_ON_ERROR = False
+
+    import config
+    if args.unthrottled:
+        config.RATE_LIMIT_GLOBAL_PER_SECOND = 10 ** 6
+        config.RATE_LIMIT_PRIVATE_CHAT_PER_SECOND = 10 ** 6
+        config.RATE_LIMIT_GROUP_PER_MINUTE = 10 ** 6
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        # Состояние бота пишется в рабочий каталог — держим его во временном
+        os.chdir(workdir)
+        try:
+            import bot as bot_module
+            logging.getLogger().setLevel(logging.WARNING)
+            poller = threading.Thread(
+                target=bot_module.bot.polling,
+                kwargs={'non_stop': True, 'interval': 0, 'timeout': 5, 'long_polling_timeout': 1},
+                daemon=True)
+            poller.start()
+
+            senders = bot_module.SENDER_USER_IDS[:args.senders]
+            per_sender = [args.tasks // len(senders) + (i < args.tasks % len(senders))
+                          for i in range(len(senders))]
+            durations = []
+            start = time.perf_counter()
+            workers = [threading.Thread(
+                target=lambda s, n: durations.extend(run_wizard(server, s, n, args.timeout)),
+                args=(sender_id, count)) for sender_id, count in zip(senders, per_sender)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+            elapsed = time.perf_counter() - start
+
+            created = len(durations)
+            report("Wizard + finalize", server, created, elapsed)
+            print(f"  tasks/sec: {created / elapsed:.2f}, "
+                  f"task p50 {percentile(durations, 0.5):.2f}s, p99 {percentile(durations, 0.99):.2f}s")
+
+            task_numbers = list(bot_module.task_manager.tasks)
+            server.reset_stats()
+            start = time.perf_counter()
+            latencies = run_storm(server, bot_module, task_numbers, args.timeout)
+            elapsed = time.perf_counter() - start
+            bot_module.edit_coalescer.flush()
+            # Правки и рассылки уходят через outbox — ждём, пока он опустеет
+            deadline = time.monotonic() + args.timeout
+            while bot_module.outbox.depth() and time.monotonic() < deadline:
+                time.sleep(0.05)
+            report("Callback storm", server, len(task_numbers), elapsed)
+            print(f"  callbacks: {len(latencies)}, {len(latencies) / elapsed:.1f}/s, "
+                  f"p50 {percentile(latencies, 0.5) * 1000:.1f}ms, "
+                  f"p99 {percentile(latencies, 0.99) * 1000:.1f}ms")
+
+            bot_module.bot.stop_polling()
+            bot_module.scheduler.shutdown(wait=False)
+            bot_module.edit_coalescer.stop()
+            bot_module.outbox.stop()
+            bot_module.task_manager.save_state()
+            if hasattr(bot_module.task_manager.store, 'close'):
+                bot_module.task_manager.store.close()
+        finally:
+            os.chdir(cwd)
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+/find на десятках тысяч задач: инвертированный индекс SearchIndex против
+линейного прохода по задачам с поиском подстроки.
+
+    python benchmarks/bench_search.py [число_задач]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from search import SEARCH_FIELDS, SearchIndex, tokenize  # noqa: E402
+
+CLIENTS = ["Ромашка", "Вектор", "Альфа Строй", "Гефест", "Технопарк", "Северсталь", "Орион"]
+EQUIPMENT = ["Cisco 2960", "Mikrotik hAP", "Huawei S5700", "Juniper EX2300", "Eltex MES2324"]
+WORDS = ["настроить", "заменить", "проверить", "коммутатор", "маршрутизатор", "VPN",
+         "резервирование", "канал", "камеры", "сервер", "точку", "доступа"]
+QUERIES = ["cisco", "ромашка коммутатор", "mikro", "vpn канал", "гефест сервер", "орион камеры"]
+
+
+def synthetic_tasks(count):
+    rng = random.Random(1)
+    return {n: {
+        'client_name': f"{rng.choice(CLIENTS)} {n}",
+        'equipment': rng.choice(EQUIPMENT),
+        'contact_person': f"Иванов {n} +7 900 {n:07d}",
+        'what_to_do': " ".join(rng.sample(WORDS, 4)),
+        'sender_id': rng.randrange(10),
+        'is_resolved': rng.random() < 0.8,
+    } for n in range(1, count + 1)}
+
+
+def linear_search(tasks, query, limit=10):
+    terms = tokenize(query)
+    found = [n for n, task in tasks.items()
+             if all(any(term in " ".join(tokenize(task.get(field))) for field in SEARCH_FIELDS)
+                    for term in terms)]
+    found.sort(reverse=True)
+    return found[:limit], len(found)
+
+
+def timed(func, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    tasks = synthetic_tasks(count)
+
+    index = SearchIndex()
+    start = time.perf_counter()
+    for n, task in tasks.items():
+        index.add(n, task)
+    print(f"{count} tasks, index built in {time.perf_counter() - start:.2f}s, "
+          f"{len(index.vocabulary)} words")
+
+    print(f"{'query':>22} {'found':>7} {'index, ms':>10} {'linear, ms':>11}")
+    for query in QUERIES:
+        numbers, total = index.search(query, resolved=False)
+        indexed = timed(lambda: index.search(query, resolved=False))
+        linear = timed(lambda: linear_search(tasks, query), repeat=2)
+        print(f"{query:>22} {total:>7} {indexed:>10.2f} {linear:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
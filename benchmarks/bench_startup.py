@@ -0,0 +1,64 @@
+"""
+Холодный старт JournalStateStore: прежний снимок (JSON с отступами) против
+сжатого построчного снимка с ленивым разбором задач. «Готов» — load()
+вернулся и бот может принимать обновления; «все задачи» — дополнительно
+разобраны все задачи, как это делает фоновая сверка TaskState.reconcile.
+
+    python benchmarks/bench_startup.py [число_задач]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from storage import JournalStateStore  # noqa: E402
+from bench_state_writes import synthetic_task  # noqa: E402
+
+
+def write_legacy(path, size):
+    data = {'task_counter': size + 1,
+            'tasks': {n: synthetic_task(n) for n in range(1, size + 1)},
+            'threads': {n: n for n in range(1, size + 1)},
+            'message_ids': {n: n for n in range(1, size + 1)},
+            'pending_tasks': {}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def measure(path):
+    start = time.perf_counter()
+    store = JournalStateStore(path, compact_every=10 ** 9)
+    store.load()
+    ready = time.perf_counter() - start
+    sum(1 for task_data in store.tasks.values() if not task_data.is_resolved)
+    full = time.perf_counter() - start
+    store.close()
+    return ready, full
+
+
+def main():
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [1000, 10000, 100000]
+    print(f"{'tasks':>8} {'format':>8} {'size, KB':>10} {'ready, ms':>10} {'all tasks, ms':>14}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            legacy_path = os.path.join(workdir, 'legacy.json')
+            write_legacy(legacy_path, size)
+            compact_path = os.path.join(workdir, 'compact.json')
+            # Тот же снимок, переписанный сворачиванием журнала в новом формате
+            store = JournalStateStore(legacy_path, os.path.join(workdir, 'convert.journal'))
+            store.load()
+            store.path = compact_path
+            store.compact()
+            store.close()
+
+            for name, path in (('json', legacy_path), ('gzip', compact_path)):
+                ready, full = measure(path)
+                print(f"{size:>8} {name:>8} {os.path.getsize(path) / 1024:>10.0f} "
+                      f"{ready * 1000:>10.1f} {full * 1000:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""
+Сравнение стоимости одной мутации: полная перезапись task_state.json
+(как раньше делал save_state) против дозаписи в журнал JournalStateStore.
+
+    python benchmarks/bench_state_writes.py [число_задач]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from records import TaskRecord  # noqa: E402
+from storage import JournalStateStore  # noqa: E402
+
+MUTATIONS = 200
+
+
+def synthetic_task(n):
+    return {
+        'client_name': f"Клиент {n}",
+        'urgency': "Срочно",
+        'what_to_do': "Настроить оборудование и проверить связь " * 3,
+        'goal': "Запуск",
+        'client_pp': "ПП",
+        'equipment': "Cisco 2960",
+        'cost_and_hours': "10000 / 4",
+        'contact_person': "Иванов И.И. +7 900 000 00 00",
+        'photo': None,
+        'sender_name': "Отправитель",
+        'status': {"Получатель": "готов взять задачу"},
+        'responded_users': [1],
+        'is_resolved': n % 2 == 0,
+        'sender_id': 1,
+        'main_chat_message_id': n,
+    }
+
+
+def bench_full_rewrite(workdir, tasks):
+    path = os.path.join(workdir, 'full.json')
+    data = {'task_counter': len(tasks) + 1, 'tasks': tasks,
+            'threads': {n: n for n in tasks}, 'message_ids': {n: n for n in tasks},
+            'pending_tasks': {}}
+    start = time.perf_counter()
+    for i in range(MUTATIONS):
+        tasks[i % len(tasks) + 1]['is_resolved'] = bool(i % 2)
+        with open(path, 'w') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    return (time.perf_counter() - start) / MUTATIONS
+
+
+def bench_journal(workdir, tasks):
+    store = JournalStateStore(os.path.join(workdir, 'journal.json'), compact_every=10 ** 9)
+    store.load()
+    for n, task in tasks.items():
+        store.tasks[n] = TaskRecord.from_dict(task)
+    store.task_counter = len(tasks) + 1
+    start = time.perf_counter()
+    for i in range(MUTATIONS):
+        store.record('resolved', task_number=i % len(tasks) + 1, value=bool(i % 2))
+    elapsed = (time.perf_counter() - start) / MUTATIONS
+    store.close()
+    return elapsed
+
+
+def main():
+    sizes = [int(sys.argv[1])] if len(sys.argv) > 1 else [100, 1000, 10000]
+    print(f"{'tasks':>8} {'full rewrite, ms':>18} {'journal, ms':>14}")
+    for size in sizes:
+        tasks = {n: synthetic_task(n) for n in range(1, size + 1)}
+        with tempfile.TemporaryDirectory() as workdir:
+            full = bench_full_rewrite(workdir, tasks)
+            journal = bench_journal(workdir, tasks)
+        print(f"{size:>8} {full * 1000:>18.3f} {journal * 1000:>14.4f}")
+
+
+if __name__ == '__main__':
+    main()
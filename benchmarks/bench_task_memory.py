@@ -0,0 +1,86 @@
+"""
+Память на задачу: прежние dict-задачи против TaskRecord (__slots__,
+статусы по user_id, множество ответивших). Задачи читаются из JSON, как
+при загрузке task_state.json, чтобы строки не разделялись между задачами.
+
+    python benchmarks/bench_task_memory.py [число_задач]
+"""
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from config import RECEIVER_USER_IDS  # noqa: E402
+from records import TaskRecord  # noqa: E402
+from tasks import STATUS_MAP  # noqa: E402
+
+STATUSES = list(STATUS_MAP.values())
+
+
+def legacy_task(n):
+    responders = RECEIVER_USER_IDS[:n % len(RECEIVER_USER_IDS) + 1]
+    return {
+        'client_name': f"Клиент {n}",
+        'urgency': "Срочно",
+        'what_to_do': "Настроить оборудование",
+        'goal': "Запуск",
+        'client_pp': "ПП",
+        'equipment': "Cisco 2960",
+        'cost_and_hours': "10000 / 4",
+        'contact_person': "Иванов И.И.",
+        'photo': None,
+        'sender_name': "Отправитель",
+        'status': {f"User {uid}": STATUSES[uid % len(STATUSES)] for uid in responders},
+        'responded_users': list(responders),
+        'is_resolved': n % 2 == 0,
+        'sender_id': 1,
+        'main_chat_message_id': n,
+        'reminder_at': None,
+        'notify_at': None,
+    }
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    tasks = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tasks, size, elapsed
+
+
+def scan_unanswered(tasks, responded):
+    start = time.perf_counter()
+    for task in tasks.values():
+        [uid for uid in RECEIVER_USER_IDS if uid not in responded(task)]
+    return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    raw = json.dumps({n: legacy_task(n) for n in range(1, count + 1)}, ensure_ascii=False)
+
+    dicts, dict_size, dict_load = measure(
+        lambda: {int(k): v for k, v in json.loads(raw).items()})
+    dict_scan = scan_unanswered(dicts, lambda task: task['responded_users'])
+    del dicts
+
+    records, record_size, record_load = measure(
+        lambda: {int(k): TaskRecord.from_dict(v) for k, v in json.loads(raw).items()})
+    record_scan = scan_unanswered(records, lambda task: task.responded)
+
+    print(f"{count} tasks")
+    print(f"{'':>12} {'MB':>8} {'bytes/task':>11} {'load, s':>8} {'unanswered scan, ms':>20}")
+    for name, size, load, scan in (("dict", dict_size, dict_load, dict_scan),
+                                   ("TaskRecord", record_size, record_load, record_scan)):
+        print(f"{name:>12} {size / 2 ** 20:>8.1f} {size / count:>11.0f} {load:>8.2f} {scan * 1000:>20.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,264 @@
+"""
+Локальная подмена Bot API для нагрузочных прогонов без настоящего Telegram.
+
+Реализует методы, которыми пользуются bot.py и async_bot.py, с настраиваемой
+задержкой ответа и случайными 429. Бота направляют на сервер через API_URL:
+
+    apihelper.API_URL = server.api_url              # TeleBot
+    asyncio_helper.API_URL = server.api_url         # AsyncTeleBot
+
+Отдельный запуск (обновления можно подкладывать через push_update из кода):
+
+    python benchmarks/fake_telegram.py --port 8081 --latency 0.05 --rate-limit 0.01
+"""
+import argparse
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Fake Bot', 'username': 'fake_bot'}
+
+
+def chat_for(chat_id):
+    chat_id = int(chat_id)
+    if chat_id > 0:
+        return {'id': chat_id, 'type': 'private', 'first_name': f"User {chat_id}"}
+    return {'id': chat_id, 'type': 'supergroup', 'title': "Info", 'is_forum': True}
+
+
+class FakeTelegramServer:
+    """
+    Bot API в памяти процесса. Ведёт журнал вызовов (время, метод, параметры)
+    и очередь обновлений для getUpdates.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 rate_limit_ratio=0.0, retry_after=1, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_ratio = rate_limit_ratio
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+
+        self.calls = []
+        self.counts = Counter()
+        self.rate_limited = Counter()
+        self.callback_answers = {}
+        self._updates = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1000)
+        self._thread_ids = itertools.count(100)
+        self._cond = threading.Condition()
+
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+        self._methods = {
+            'getMe': lambda p: BOT_USER,
+            'deleteWebhook': lambda p: True,
+            'setWebhook': lambda p: True,
+            'getUpdates': self._get_updates,
+            'sendMessage': self._send_message,
+            'sendPhoto': self._send_message,
+            'editMessageText': self._edit_message,
+            'editMessageCaption': self._edit_message,
+            'editMessageReplyMarkup': self._edit_message,
+            'createForumTopic': self._create_forum_topic,
+            'editForumTopic': lambda p: True,
+            'closeForumTopic': lambda p: True,
+            'reopenForumTopic': lambda p: True,
+            'getChat': lambda p: chat_for(p['chat_id']),
+            'getChatMember': self._get_chat_member,
+            'answerCallbackQuery': self._answer_callback_query,
+        }
+
+    @property
+    def api_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/bot{{0}}/{{1}}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name='fake-telegram', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    # --- Управление из бенчмарка ---
+
+    def push_update(self, kind, payload):
+        """Кладёт обновление в очередь getUpdates; возвращает update_id."""
+        with self._cond:
+            update_id = next(self._update_ids)
+            self._updates.append({'update_id': update_id, kind: payload})
+            self._cond.notify_all()
+        return update_id
+
+    def wait_for(self, predicate, timeout=30):
+        """Ждёт, пока predicate(self) станет истинным; проверяется после каждого вызова API."""
+        with self._cond:
+            return self._cond.wait_for(lambda: predicate(self), timeout)
+
+    def count_calls(self, method, chat_id=None):
+        with self._cond:
+            return sum(1 for _, name, params in self.calls
+                       if name == method and (chat_id is None or str(params.get('chat_id')) == str(chat_id)))
+
+    def reset_stats(self):
+        with self._cond:
+            self.calls.clear()
+            self.counts.clear()
+            self.rate_limited.clear()
+            self.callback_answers.clear()
+
+    # --- Методы Bot API ---
+
+    def _get_updates(self, params):
+        offset = int(params.get('offset') or 0)
+        limit = int(params.get('limit') or 100)
+        timeout = float(params.get('timeout') or 0)
+        with self._cond:
+            while self._updates and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            if not self._updates:
+                self._cond.wait(timeout)
+            return list(itertools.islice(self._updates, limit))
+
+    def _send_message(self, params):
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': chat_for(params['chat_id']),
+            'from': BOT_USER,
+        }
+        if 'message_thread_id' in params:
+            message['message_thread_id'] = int(params['message_thread_id'])
+        if 'text' in params:
+            message['text'] = params['text']
+        if 'caption' in params:
+            message['caption'] = params['caption']
+        return message
+
+    def _edit_message(self, params):
+        message = {
+            'message_id': int(params['message_id']),
+            'date': int(time.time()),
+            'chat': chat_for(params['chat_id']),
+            'from': BOT_USER,
+        }
+        if 'text' in params:
+            message['text'] = params['text']
+        return message
+
+    def _create_forum_topic(self, params):
+        return {'message_thread_id': next(self._thread_ids), 'name': params['name'],
+                'icon_color': int(params.get('icon_color') or 0)}
+
+    def _get_chat_member(self, params):
+        user_id = int(params['user_id'])
+        return {'status': 'member',
+                'user': {'id': user_id, 'is_bot': False, 'first_name': f"User {user_id}"}}
+
+    def _answer_callback_query(self, params):
+        self.callback_answers[params['callback_query_id']] = time.perf_counter()
+        return True
+
+    # --- HTTP ---
+
+    def dispatch(self, method, params):
+        """Возвращает (HTTP-код, тело ответа) для вызова метода Bot API."""
+        handler = self._methods.get(method)
+        if handler is None:
+            return 404, {'ok': False, 'error_code': 404, 'description': f"Not Found: method {method}"}
+
+        if method != 'getUpdates':
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+            if delay:
+                time.sleep(delay)
+            if self.rate_limit_ratio and self.random.random() < self.rate_limit_ratio:
+                with self._cond:
+                    self.rate_limited[method] += 1
+                return 429, {'ok': False, 'error_code': 429,
+                             'description': f"Too Many Requests: retry after {self.retry_after}",
+                             'parameters': {'retry_after': self.retry_after}}
+
+        result = handler(params)
+        if method != 'getUpdates':
+            with self._cond:
+                self.calls.append((time.perf_counter(), method, params))
+                self.counts[method] += 1
+                self._cond.notify_all()
+        return 200, {'ok': True, 'result': result}
+
+    def _make_handler(self):
+        server = self
+
+        class FakeTelegramHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def _handle(self):
+                url = urlsplit(self.path)
+                method = url.path.rsplit('/', 1)[-1]
+                params = dict(parse_qsl(url.query))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    body = self.rfile.read(length).decode()
+                    content_type = self.headers.get('Content-Type', '')
+                    if content_type.startswith('application/json'):
+                        params.update(json.loads(body))
+                    elif content_type.startswith('application/x-www-form-urlencoded'):
+                        params.update(parse_qsl(body))
+
+                code, payload = server.dispatch(method, params)
+                data = json.dumps(payload, ensure_ascii=False).encode()
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return FakeTelegramHandler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help="Задержка ответа, с")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Случайная добавка к задержке, с")
+    parser.add_argument('--rate-limit', type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument('--retry-after', type=int, default=1)
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    logging.basicConfig(level=logging.INFO)
+    server = FakeTelegramServer(args.host, args.port, args.latency, args.jitter,
+                                args.rate_limit, args.retry_after).start()
+    logger.info(f"Fake Bot API listening, API_URL={server.api_url}")
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
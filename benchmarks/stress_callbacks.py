@@ -0,0 +1,103 @@
+"""
+Стресс-тест потокобезопасности TaskState: параллельное создание задач,
+нажатия кнопок получателей и форума, сворачивание журнала. В конце
+проверяет инварианты в памяти и после перечитывания состояния с диска.
+
+    python benchmarks/stress_callbacks.py [потоков] [операций_на_поток]
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from tasks import TaskState, TASK_FIELDS, STATUS_MAP  # noqa: E402
+
+SENDERS = list(range(1, 6))
+RECEIVERS = list(range(100, 120))
+
+
+class OfflineTaskState(TaskState):
+    """TaskState без таймеров и Bot API."""
+
+    def _arm_timer(self, task_number, run_date):
+        pass
+
+
+def create_task(state, chat_id):
+    with state.draft_lock(chat_id):
+        state.create_task(chat_id)
+        for field, _ in TASK_FIELDS:
+            state.set_draft_field(chat_id, field, f"{field} {chat_id}")
+        draft = state.drafts.drop(chat_id).fields
+    return state.register_task(chat_id, draft, f"Sender {chat_id}")[0]
+
+
+def worker(state, created, operations, errors):
+    rng = random.Random()
+    try:
+        for _ in range(operations):
+            roll = rng.random()
+            if roll < 0.05 or not created:
+                created.append(create_task(state, rng.choice(SENDERS)))
+            elif roll < 0.8:
+                receiver = rng.choice(RECEIVERS)
+                state.set_status(rng.choice(created), f"User {receiver}",
+                                 STATUS_MAP[rng.choice(list(STATUS_MAP))], user_id=receiver)
+            elif roll < 0.99:
+                state.try_set_resolved(rng.choice(created), rng.random() < 0.5)
+            else:
+                state.save_state()
+            task_number = rng.choice(created)
+            state.generate_task_message(task_number, state.tasks[task_number], with_status=True)
+    except Exception as e:
+        errors.append(repr(e))
+
+
+def check(state, created):
+    assert len(created) == len(set(created)), "duplicate task numbers"
+    assert sorted(state.tasks) == sorted(created), "lost tasks"
+    for task in state.tasks.values():
+        assert set(task.status) == task.responded, "status/responders mismatch"
+
+
+def main():
+    threads_count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            state = OfflineTaskState()
+            created, errors = [], []
+            threads = [threading.Thread(target=worker, args=(state, created, operations, errors))
+                       for _ in range(threads_count)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+
+            assert not errors, errors[:5]
+            check(state, created)
+            expected = {n: state.tasks[n].to_dict() for n in state.tasks}
+            state.store.close()
+
+            reloaded = OfflineTaskState()
+            check(reloaded, created)
+            assert {n: reloaded.tasks[n].to_dict() for n in reloaded.tasks} == expected, "state differs after reload"
+            reloaded.store.close()
+        finally:
+            os.chdir(cwd)
+
+    total = threads_count * operations
+    print(f"{total} operations in {threads_count} threads: {elapsed:.2f}s "
+          f"({total / elapsed:.0f} ops/s), {len(created)} tasks, invariants OK")
+
+
+if __name__ == '__main__':
+    main()
@@ -24,5 +24,104 @@
 SENDER_USER_IDS = [439829284,868351136,775886747,717772330,1321886435,6140991908,927095620,1702816126,1764606409,5193948461,735630157,928974700]
 RECEIVER_USER_IDS = [6738260909,1135050609,1707387200,1015733877,399985298,1080096149,1129422862]
 
+# Receiver routing: a task goes to the receivers of every rule whose conditions all match,
+# or to all RECEIVER_USER_IDS when none does. Conditions are case-insensitive substrings of
+# equipment, urgency or client_name (a list matches any of them), e.g.
+#   {'equipment': ['cisco', 'juniper'], 'receivers': [1135050609, 1707387200]},
+#   {'urgency': 'срочно', 'client_name': 'ромашка', 'receivers': [6738260909]},
+ROUTING_RULES = []
+
 # Chat ID for info channel/group
 INFO_CHAT_ID = -1002431584497
+
+
+# State persistence: 'json' (snapshot + append-only journal) or 'sqlite'
+STATE_BACKEND = 'json'
+STATE_FILE = 'task_state.json'
+STATE_JOURNAL_FILE = 'task_state.journal'
+STATE_COMPACT_EVERY = 500
+STATE_DB_FILE = 'task_state.db'
+
+
+# TeleBot handler threads; TaskManager locks per task, so callbacks run in parallel
+HANDLER_THREADS = 4
+
+# Number of outbox workers sending deliveries, reminders and message edits
+DELIVERY_WORKERS = 8
+
+# Durable outbox: failed sends are retried with exponential backoff and survive restarts
+OUTBOX_FILE = 'task_outbox.db'
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_BASE_SECONDS = 2
+OUTBOX_RETRY_MAX_SECONDS = 600
+
+
+# Outbound Bot API rate limits (Telegram flood limits)
+RATE_LIMIT_GLOBAL_PER_SECOND = 30
+RATE_LIMIT_PRIVATE_CHAT_PER_SECOND = 1
+RATE_LIMIT_GROUP_PER_MINUTE = 20
+RATE_LIMIT_MAX_RETRIES = 3
+
+
+# Seconds to collect status edits of the same message before sending one edit
+EDIT_COALESCE_WINDOW = 1.0
+
+
+# Max cached rendered task messages / keyboards (LRU)
+RENDER_CACHE_SIZE = 1024
+
+# Max distinct repeated task values (urgency, sender, status pairs, receiver sets) shared
+# between in-memory tasks (LRU); values of archived tasks are eventually evicted
+RECORD_SHARED_VALUES_CACHE_SIZE = 10000
+
+
+# Reminder to receivers / notice to the info chat about unanswered tasks
+REMINDER_DELAY_MINUTES = 30
+UNANSWERED_NOTIFY_DELAY_MINUTES = 60
+
+# 'immediate': a message per task per receiver when its deadline comes;
+# 'digest': every DIGEST_INTERVAL_MINUTES one reminder per receiver listing all
+# due tasks and one summary of unanswered tasks in the info chat
+REMINDER_MODE = 'immediate'
+DIGEST_INTERVAL_MINUTES = 60
+
+
+# Cached user profiles (display name, username) used in task and notice texts
+USER_PROFILE_CACHE_SIZE = 1000
+USER_PROFILE_TTL = 24 * 60 * 60
+
+
+# Webhook server (python bot.py --mode webhook or BOT_MODE=webhook).
+# Secret token and public URL are read from .env: WEBHOOK_SECRET, WEBHOOK_URL
+WEBHOOK_HOST = '127.0.0.1'
+WEBHOOK_PORT = 8443
+WEBHOOK_PATH = '/telegram-webhook'
+
+
+# Resolved tasks older than ARCHIVE_AFTER_DAYS move to a gzip append-only archive;
+# the check runs every ARCHIVE_INTERVAL_HOURS. "Вернуть в работу" loads them back
+ARCHIVE_FILE = 'task_archive.jsonl.gz'
+ARCHIVE_AFTER_DAYS = 30
+ARCHIVE_INTERVAL_HOURS = 6
+
+
+# /find: inverted index over client, equipment, contacts and task text
+SEARCH_INDEX_FILE = 'task_index.json'
+FIND_RESULTS_LIMIT = 10
+
+# Task wizard drafts: kept in their own file and dropped after DRAFT_TTL_MINUTES without a reply
+DRAFT_FILE = 'task_drafts.json'
+DRAFT_TTL_MINUTES = 120
+DRAFT_EXPIRE_INTERVAL_MINUTES = 5
+
+# /stats: per-day counters kept by the state store
+STATS_DEFAULT_DAYS = 7
+STATS_MAX_DAYS = 365
+
+
+# Prometheus metrics endpoint (http://METRICS_HOST:METRICS_PORT/metrics); None disables it.
+# METRICS_DUMP_FILE: also write the same text to a file every METRICS_DUMP_INTERVAL seconds
+METRICS_HOST = '127.0.0.1'
+METRICS_PORT = 9108
+METRICS_DUMP_FILE = None
+METRICS_DUMP_INTERVAL = 60
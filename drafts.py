@@ -0,0 +1,126 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class DraftSession:
+    """
+    Черновик задачи в мастере создания: значения полей и курсор шага —
+    номер поля, которое отправитель заполняет сейчас.
+    """
+    __slots__ = ('fields', 'step', 'updated_at')
+
+    def __init__(self, fields, step=0, updated_at=None):
+        self.fields = fields
+        self.step = step
+        self.updated_at = updated_at if updated_at is not None else time.time()
+
+
+class DraftStore:
+    """
+    Черновики отдельно от состояния задач: свой небольшой файл (task_drafts.json),
+    который перезаписывается при каждом шаге мастера, не трогая снимок и журнал задач.
+
+    Сессии лежат в порядке последнего изменения, поэтому устаревшие по ttl
+    всегда в начале и находятся без прохода по всем черновикам.
+    """
+
+    def __init__(self, path='task_drafts.json', ttl=3600):
+        self.path = path
+        self.ttl = ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # Сериализация и запись файла под одной блокировкой: старый снимок не перезапишет новый
+        self._save_lock = threading.Lock()
+
+    def __contains__(self, chat_id):
+        return chat_id in self._sessions
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, chat_id):
+        return self._sessions.get(chat_id)
+
+    def start(self, chat_id, fields, step=0):
+        session = DraftSession(fields, step)
+        with self._lock:
+            self._sessions[chat_id] = session
+            self._sessions.move_to_end(chat_id)
+        self.save()
+        return session
+
+    def set_field(self, chat_id, field, value, step):
+        """Записывает значение и переводит курсор на step; None, если черновика уже нет."""
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None:
+                return None
+            session.fields[field] = value
+            session.step = step
+            session.updated_at = time.time()
+            self._sessions.move_to_end(chat_id)
+        self.save()
+        return session
+
+    def drop(self, chat_id):
+        with self._lock:
+            session = self._sessions.pop(chat_id, None)
+        if session is not None:
+            self.save()
+        return session
+
+    def expired(self, now=None):
+        """chat_id черновиков без изменений дольше ttl."""
+        cutoff = (now or time.time()) - self.ttl
+        chat_ids = []
+        with self._lock:
+            for chat_id, session in self._sessions.items():
+                if session.updated_at > cutoff:
+                    break
+                chat_ids.append(chat_id)
+        return chat_ids
+
+    def drop_if_expired(self, chat_id, now=None):
+        """Удаляет черновик, если он всё ещё устарел (его могли успеть дополнить)."""
+        cutoff = (now or time.time()) - self.ttl
+        with self._lock:
+            session = self._sessions.get(chat_id)
+            if session is None or session.updated_at > cutoff:
+                return False
+            del self._sessions[chat_id]
+        self.save()
+        return True
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading drafts: {e}")
+            return
+        sessions = sorted(((int(chat_id), DraftSession(item['fields'], item['step'], item['updated_at']))
+                           for chat_id, item in data.items()), key=lambda pair: pair[1].updated_at)
+        with self._lock:
+            self._sessions = OrderedDict(sessions)
+
+    def save(self):
+        with self._save_lock:
+            with self._lock:
+                data = json.dumps({chat_id: {'fields': session.fields, 'step': session.step,
+                                             'updated_at': session.updated_at}
+                                   for chat_id, session in self._sessions.items()}, ensure_ascii=False)
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(data)
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error(f"Error saving drafts: {e}")
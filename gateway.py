@@ -0,0 +1,411 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from telebot.apihelper import ApiTelegramException
+
+try:
+    from telebot.asyncio_helper import ApiTelegramException as AsyncApiTelegramException
+except ImportError:  # aiohttp не установлен — асинхронный движок недоступен
+    AsyncApiTelegramException = ApiTelegramException
+
+from metrics import api_latency, api_errors
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+# Методы, у которых первый аргумент (или chat_id=) — чат, в который идёт запись
+CHAT_METHODS = {
+    'send_message', 'send_photo', 'edit_message_text', 'edit_message_caption',
+    'edit_message_reply_markup', 'create_forum_topic', 'edit_forum_topic',
+    'close_forum_topic', 'reopen_forum_topic',
+}
+INTERACTIVE_METHODS = {'answer_callback_query'}
+
+
+class TokenBucket:
+    """Ведро токенов с резервированием: токены могут уйти в минус, вызывающий ждёт долг."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        self._refill(now)
+        return 0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def reserve(self, now):
+        """Занимает токен и возвращает, сколько секунд нужно подождать до его появления."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def block(self, seconds, now):
+        """Запрещает выдачу токенов на seconds (ответ 429 с retry_after)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class TelegramGateway:
+    """
+    Единая точка исходящих вызовов Bot API.
+
+    Ограничивает скорость глобально и по каждому чату (личные чаты и группы
+    имеют разные лимиты), при 429 ждёт retry_after и повторяет вызов.
+    Глобальные токены выдаются по приоритету: ответы на нажатия кнопок
+    обгоняют фоновые рассылки вроде напоминаний.
+
+        api = TelegramGateway(bot)
+        api.send_message(chat_id, text)
+        api.send_message(user_id, text, priority=PRIORITY_BACKGROUND)
+    """
+
+    MAX_CHAT_BUCKETS = 10000
+
+    def __init__(self, bot, global_rate=30, private_chat_rate=1, group_rate_per_minute=20,
+                 max_retries=3):
+        self.bot = bot
+        self.private_chat_rate = private_chat_rate
+        self.group_rate_per_minute = group_rate_per_minute
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chat_buckets = {}
+        self._chat_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def __getattr__(self, method_name):
+        method = getattr(self.bot, method_name)
+        if not callable(method):
+            return method
+
+        def call(*args, priority=None, **kwargs):
+            return self.call(method_name, *args, priority=priority, **kwargs)
+
+        return call
+
+    def call(self, method_name, *args, priority=None, **kwargs):
+        if priority is None:
+            priority = PRIORITY_INTERACTIVE if method_name in INTERACTIVE_METHODS else PRIORITY_NORMAL
+        chat_id = None
+        if method_name in CHAT_METHODS:
+            chat_id = kwargs.get('chat_id', args[0] if args else None)
+
+        method = getattr(self.bot, method_name)
+        attempt = 0
+        while True:
+            self._acquire(chat_id, priority)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            except ApiTelegramException as e:
+                api_errors.inc(method=method_name, code=e.error_code)
+                if e.error_code != 429 or attempt >= self.max_retries:
+                    raise
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                attempt += 1
+                logger.warning(
+                    f"Flood limit on {method_name} (chat {chat_id}), retry in {retry_after}s "
+                    f"({attempt}/{self.max_retries})")
+                self._block(chat_id, retry_after)
+            except Exception as e:
+                api_errors.inc(method=method_name, code=type(e).__name__)
+                raise
+            finally:
+                api_latency.observe(time.perf_counter() - start, method=method_name)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if len(self._chat_buckets) >= self.MAX_CHAT_BUCKETS:
+                now = time.monotonic()
+                self._chat_buckets = {
+                    key: value for key, value in self._chat_buckets.items() if not value.is_idle(now)
+                }
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.private_chat_rate, self.private_chat_rate)
+            else:
+                rate = self.group_rate_per_minute / 60
+                bucket = TokenBucket(rate, self.group_rate_per_minute)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _acquire(self, chat_id, priority):
+        if chat_id is not None:
+            with self._chat_lock:
+                delay = self._chat_bucket(chat_id).reserve(time.monotonic())
+            if delay > 0:
+                time.sleep(delay)
+
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                if self._waiters[0] == ticket:
+                    now = time.monotonic()
+                    delay = self._global.delay(now)
+                    if delay <= 0:
+                        self._global.take(now)
+                        heapq.heappop(self._waiters)
+                        self._cond.notify_all()
+                        return
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+
+    def _block(self, chat_id, seconds):
+        now = time.monotonic()
+        if chat_id is not None:
+            with self._chat_lock:
+                self._chat_bucket(chat_id).block(seconds, now)
+        else:
+            with self._cond:
+                self._global.block(seconds, now)
+
+
+def edit_fingerprint(method_name, kwargs):
+    return method_name, tuple(
+        (name, value.to_json() if hasattr(value, 'to_json') else value)
+        for name, value in sorted(kwargs.items())
+    )
+
+
+class EditCoalescer:
+    """
+    Схлопывает частые правки одного и того же сообщения.
+
+    submit() откладывает правку (chat_id, message_id) на window секунд; все
+    правки, пришедшие за это время, превращаются в одну. Текст строится
+    функцией render в момент отправки, поэтому уходит всегда последнее
+    состояние. Правка, пришедшая во время отправки, планируется заново —
+    финальное состояние записывается гарантированно.
+
+    render возвращает (имя_метода, kwargs) или None, если править нечего.
+    """
+
+    MAX_REMEMBERED = 10000
+
+    def __init__(self, api, window=1.0):
+        self.api = api
+        self.window = window
+        self._pending = {}
+        self._last_sent = OrderedDict()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._worker = threading.Thread(target=self._run, name='edit-coalescer', daemon=True)
+        self._worker.start()
+
+    def submit(self, chat_id, message_id, render):
+        key = (chat_id, message_id)
+        with self._cond:
+            if key in self._pending:
+                deadline = self._pending[key][0]
+            else:
+                deadline = time.monotonic() + self.window
+            self._pending[key] = (deadline, render)
+            self._cond.notify()
+
+    def flush(self):
+        """Немедленно отправляет все отложенные правки (при остановке бота)."""
+        with self._cond:
+            pending, self._pending = self._pending, {}
+        for key, (_, render) in pending.items():
+            self._send(key, render)
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._worker.join()
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    now = time.monotonic()
+                    due = [key for key, (deadline, _) in self._pending.items() if deadline <= now]
+                    if due:
+                        break
+                    next_deadline = min((deadline for deadline, _ in self._pending.values()), default=None)
+                    self._cond.wait(None if next_deadline is None else next_deadline - now)
+                if self._stopped:
+                    return
+                batch = [(key, self._pending.pop(key)[1]) for key in due]
+            for key, render in batch:
+                self._send(key, render)
+
+    def _send(self, key, render):
+        try:
+            edit = render()
+            if edit is None:
+                return
+            method_name, kwargs = edit
+            fingerprint = edit_fingerprint(method_name, kwargs)
+            if self._last_sent.get(key) == fingerprint:
+                return
+            self.api.call(method_name, **kwargs)
+            self._last_sent[key] = fingerprint
+            self._last_sent.move_to_end(key)
+            if len(self._last_sent) > self.MAX_REMEMBERED:
+                self._last_sent.popitem(last=False)
+        except ApiTelegramException as e:
+            if 'message is not modified' not in str(e.description):
+                logger.error(f"Error editing message {key}: {e}")
+        except Exception as e:
+            logger.error(f"Error editing message {key}: {e}")
+
+
+class AsyncTelegramGateway(TelegramGateway):
+    """
+    Тот же шлюз для AsyncTeleBot: лимиты и приоритеты общие с синхронной
+    версией, ожидание — через asyncio, а не блокировкой потока.
+    """
+
+    def __init__(self, bot, **kwargs):
+        super().__init__(bot, **kwargs)
+        self._async_cond = asyncio.Condition()
+
+    def __getattr__(self, method_name):
+        method = getattr(self.bot, method_name)
+        if not callable(method):
+            return method
+
+        async def call(*args, priority=None, **kwargs):
+            return await self.call(method_name, *args, priority=priority, **kwargs)
+
+        return call
+
+    async def call(self, method_name, *args, priority=None, **kwargs):
+        if priority is None:
+            priority = PRIORITY_INTERACTIVE if method_name in INTERACTIVE_METHODS else PRIORITY_NORMAL
+        chat_id = None
+        if method_name in CHAT_METHODS:
+            chat_id = kwargs.get('chat_id', args[0] if args else None)
+
+        method = getattr(self.bot, method_name)
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, priority)
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except AsyncApiTelegramException as e:
+                api_errors.inc(method=method_name, code=e.error_code)
+                if e.error_code != 429 or attempt >= self.max_retries:
+                    raise
+                retry_after = (e.result_json.get('parameters') or {}).get('retry_after', 1)
+                attempt += 1
+                logger.warning(
+                    f"Flood limit on {method_name} (chat {chat_id}), retry in {retry_after}s "
+                    f"({attempt}/{self.max_retries})")
+                self._block(chat_id, retry_after)
+            except Exception as e:
+                api_errors.inc(method=method_name, code=type(e).__name__)
+                raise
+            finally:
+                api_latency.observe(time.perf_counter() - start, method=method_name)
+
+    async def _acquire(self, chat_id, priority):
+        if chat_id is not None:
+            with self._chat_lock:
+                delay = self._chat_bucket(chat_id).reserve(time.monotonic())
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        async with self._async_cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            while True:
+                if self._waiters[0] == ticket:
+                    now = time.monotonic()
+                    delay = self._global.delay(now)
+                    if delay <= 0:
+                        self._global.take(now)
+                        heapq.heappop(self._waiters)
+                        self._async_cond.notify_all()
+                        return
+                    try:
+                        await asyncio.wait_for(self._async_cond.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    await self._async_cond.wait()
+
+
+class AsyncEditCoalescer:
+    """Асинхронный аналог EditCoalescer: одна отложенная правка на сообщение."""
+
+    def __init__(self, api, window=1.0):
+        self.api = api
+        self.window = window
+        self._pending = {}
+        self._locks = {}
+        self._last_sent = OrderedDict()
+        self._tasks = set()
+
+    def submit(self, chat_id, message_id, render):
+        key = (chat_id, message_id)
+        first = key not in self._pending
+        self._pending[key] = render
+        if first:
+            task = asyncio.get_running_loop().create_task(self._flush_later(key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for key, render in pending.items():
+            await self._send(key, render)
+
+    async def _flush_later(self, key):
+        await asyncio.sleep(self.window)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            render = self._pending.pop(key, None)
+            if render is not None:
+                await self._send(key, render)
+        if key not in self._pending:
+            self._locks.pop(key, None)
+
+    async def _send(self, key, render):
+        try:
+            edit = render()
+            if edit is None:
+                return
+            method_name, kwargs = edit
+            fingerprint = edit_fingerprint(method_name, kwargs)
+            if self._last_sent.get(key) == fingerprint:
+                return
+            await self.api.call(method_name, **kwargs)
+            self._last_sent[key] = fingerprint
+            self._last_sent.move_to_end(key)
+            if len(self._last_sent) > EditCoalescer.MAX_REMEMBERED:
+                self._last_sent.popitem(last=False)
+        except AsyncApiTelegramException as e:
+            if 'message is not modified' not in str(e.description):
+                logger.error(f"Error editing message {key}: {e}")
+        except Exception as e:
+            logger.error(f"Error editing message {key}: {e}")
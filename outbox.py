@@ -0,0 +1,244 @@
+import asyncio
+import json
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from gateway import PRIORITY_NORMAL
+from metrics import outbox_sent, outbox_retries, outbox_dropped
+
+logger = logging.getLogger(__name__)
+
+# Ошибки Bot API, которые повтор не исправит (неверный запрос, бот заблокирован, чат удалён)
+PERMANENT_ERROR_CODES = {400, 403, 404}
+
+EDIT_METHODS = {'edit_message_text', 'edit_message_caption', 'edit_message_reply_markup'}
+
+
+def _serialize(kwargs):
+    # Клавиатуры сохраняются строкой JSON — Bot API принимает reply_markup и так
+    return json.dumps({name: value.to_json() if hasattr(value, 'to_json') else value
+                       for name, value in kwargs.items()}, ensure_ascii=False)
+
+
+def edit_key(method_name, kwargs):
+    return f"{method_name}:{kwargs.get('chat_id')}:{kwargs.get('message_id')}"
+
+
+class Outbox:
+    """
+    Надёжная очередь исходящих вызовов Bot API (task_outbox.db).
+
+    put() записывает вызов в SQLite и сразу возвращается; фоновые воркеры
+    отправляют его через TelegramGateway, при сбое повторяют с
+    экспоненциальной задержкой, после перезапуска продолжают с того же места.
+    Вызовы с одним key схлопываются: новый заменяет ещё не отправленный
+    (правки одного сообщения, рассылка одной задачи одному получателю).
+
+        outbox = Outbox(api)
+        outbox.put('send_message', key=f"reminder:{user_id}", chat_id=user_id, text=text)
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT UNIQUE,
+            method TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            priority INTEGER NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            version INTEGER NOT NULL DEFAULT 0,
+            next_attempt REAL NOT NULL,
+            created_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_attempt);
+    """
+
+    def __init__(self, api, path='task_outbox.db', workers=4, max_attempts=8,
+                 retry_base=2.0, retry_max=600.0):
+        self.api = api
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        self._cond = threading.Condition(threading.RLock())
+        self._inflight = set()
+        self._stopped = False
+        self._threads = []
+
+    def start(self):
+        depth = self.depth()
+        if depth:
+            logger.info(f"Outbox: {depth} calls left from the previous run")
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'outbox-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Дожидается вызовов в работе; неотправленное остаётся в файле до следующего запуска."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self.close()
+
+    def close(self):
+        with self._cond:
+            self._conn.close()
+
+    def put(self, method_name, key=None, priority=PRIORITY_NORMAL, **kwargs):
+        now = time.time()
+        with self._cond:
+            self._conn.execute(
+                "INSERT INTO outbox (key, method, payload, priority, next_attempt, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET method = excluded.method, payload = excluded.payload, "
+                "priority = excluded.priority, attempts = 0, version = version + 1, "
+                "next_attempt = excluded.next_attempt",
+                (key, method_name, _serialize(kwargs), priority, now, now))
+            self._cond.notify()
+        self._wake()
+
+    def call(self, method_name, **kwargs):
+        """Интерфейс шлюза для EditCoalescer: правки одного сообщения схлопываются."""
+        key = edit_key(method_name, kwargs) if method_name in EDIT_METHODS else None
+        self.put(method_name, key=key, **kwargs)
+
+    def depth(self):
+        with self._cond:
+            return self._conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def oldest_age(self):
+        """Сколько секунд ждёт самый старый неотправленный вызов."""
+        with self._cond:
+            oldest = self._conn.execute("SELECT MIN(created_at) FROM outbox").fetchone()[0]
+        return time.time() - oldest if oldest is not None else 0
+
+    def _wake(self):
+        pass
+
+    def _exclude_inflight(self):
+        return f"id NOT IN ({','.join('?' * len(self._inflight))})", tuple(self._inflight)
+
+    def _claim(self):
+        """Следующий вызов, срок которого подошёл, или None; под self._cond."""
+        condition, params = self._exclude_inflight()
+        row = self._conn.execute(
+            f"SELECT id, method, payload, priority, attempts, version FROM outbox "
+            f"WHERE next_attempt <= ? AND {condition} ORDER BY priority, next_attempt LIMIT 1",
+            (time.time(),) + params).fetchone()
+        if row is not None:
+            self._inflight.add(row[0])
+        return row
+
+    def _next_delay(self):
+        condition, params = self._exclude_inflight()
+        next_attempt = self._conn.execute(
+            f"SELECT MIN(next_attempt) FROM outbox WHERE {condition}", params).fetchone()[0]
+        return None if next_attempt is None else max(next_attempt - time.time(), 0)
+
+    def _finish(self, item, error):
+        item_id, method_name, _, _, attempts, version = item
+        with self._cond:
+            self._inflight.discard(item_id)
+            if error is None or getattr(error, 'error_code', None) in PERMANENT_ERROR_CODES:
+                if error is None:
+                    outbox_sent.inc(method=method_name)
+                elif 'message is not modified' not in str(getattr(error, 'description', '')):
+                    outbox_dropped.inc(method=method_name, reason='permanent')
+                    logger.error(f"Outbox: {method_name} failed permanently: {error}")
+                # Если вызов заменили, пока он отправлялся, версия другая — новый останется в очереди
+                self._conn.execute("DELETE FROM outbox WHERE id = ? AND version = ?", (item_id, version))
+            elif attempts + 1 >= self.max_attempts:
+                outbox_dropped.inc(method=method_name, reason='attempts')
+                logger.error(f"Outbox: {method_name} dropped after {attempts + 1} attempts: {error}")
+                self._conn.execute("DELETE FROM outbox WHERE id = ? AND version = ?", (item_id, version))
+            else:
+                delay = min(self.retry_base * 2 ** attempts, self.retry_max) * random.uniform(0.5, 1)
+                outbox_retries.inc(method=method_name)
+                logger.warning(f"Outbox: {method_name} failed ({error}), retry in {delay:.0f}s")
+                self._conn.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ? AND version = ?",
+                    (attempts + 1, time.time() + delay, item_id, version))
+            self._cond.notify_all()
+        self._wake()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    item = self._claim()
+                    if item is not None:
+                        break
+                    self._cond.wait(self._next_delay())
+                if self._stopped:
+                    return
+            _, method_name, payload, priority, _, _ = item
+            try:
+                self.api.call(method_name, priority=priority, **json.loads(payload))
+                error = None
+            except Exception as e:
+                error = e
+            self._finish(item, error)
+
+
+class AsyncOutbox(Outbox):
+    """Та же очередь для AsyncTeleBot: воркеры — задачи asyncio в цикле бота."""
+
+    def __init__(self, api, **kwargs):
+        super().__init__(api, **kwargs)
+        self._loop = None
+        self._wakeup = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        depth = self.depth()
+        if depth:
+            logger.info(f"Outbox: {depth} calls left from the previous run")
+        self._threads = [self._loop.create_task(self._run_async()) for _ in range(self.workers)]
+        return self
+
+    async def stop(self):
+        self._stopped = True
+        self._wake()
+        await asyncio.gather(*self._threads)
+        self.close()
+
+    async def call(self, method_name, **kwargs):
+        super().call(method_name, **kwargs)
+
+    def _wake(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run_async(self):
+        while not self._stopped:
+            # Сброс до выборки: put() между выборкой и ожиданием не потеряется
+            self._wakeup.clear()
+            with self._cond:
+                item = self._claim()
+                delay = self._next_delay() if item is None else None
+            if item is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, method_name, payload, priority, _, _ = item
+            try:
+                await self.api.call(method_name, priority=priority, **json.loads(payload))
+                error = None
+            except Exception as e:
+                error = e
+            self._finish(item, error)
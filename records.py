@@ -0,0 +1,127 @@
+from cache import LRUCache
+from config import RECORD_SHARED_VALUES_CACHE_SIZE
+
+# Ограниченный кэш: значения задач, ушедших в архив, со временем вытесняются
+_shared = LRUCache(RECORD_SHARED_VALUES_CACHE_SIZE)
+
+
+def _share(value):
+    """Один объект на все задачи для повторяющихся неизменяемых значений."""
+    return _shared.get_or_create(value, lambda: value)
+
+
+class TaskRecord:
+    """
+    Задача в памяти: фиксированный набор полей в __slots__ вместо dict с
+    одинаковыми строковыми ключами в каждой задаче.
+
+    status — user_id -> (имя, статус), responded — frozenset ответивших
+    получателей. Пары (имя, статус), id и множества ответивших общие для всех
+    задач, поэтому почти не занимают места. Для кода, который работает и с
+    черновиками-словарями, поддержаны task['field'] и task.get('field').
+    В JSON (снимок, SQLite, архив) пишется словарь через to_dict; from_dict
+    читает и его, и прежний формат со статусами по имени.
+    """
+
+    FIELDS = (
+        'client_name', 'urgency', 'what_to_do', 'goal', 'client_pp', 'equipment',
+        'cost_and_hours', 'contact_person', 'photo', 'sender_name', 'sender_id',
+        'is_resolved', 'resolved_at', 'main_chat_message_id', 'reminder_at', 'notify_at', 'created_at',
+        'receivers', 'topic_resolved',
+    )
+    # Поля с небольшим числом различных значений
+    SHARED_FIELDS = frozenset({'urgency', 'sender_name', 'sender_id', 'receivers'})
+    __slots__ = FIELDS + ('status', 'responded', 'extra')
+    _FIELD_SET = frozenset(FIELDS)
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, None)
+        self.is_resolved = False
+        self.status = {}
+        self.responded = _share(frozenset())
+        self.extra = None
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls()
+        extra = {}
+        for key, value in data.items():
+            if key in cls._FIELD_SET:
+                if key == 'receivers' and value is not None:
+                    value = tuple(value)  # в JSON — список, в памяти — общий кортеж
+                setattr(record, key, _share(value) if key in cls.SHARED_FIELDS else value)
+            elif key not in ('status', 'responder_names', 'responded_users'):
+                extra[key] = value
+        record.responded = _share(frozenset(data.get('responded_users') or ()))
+        record.extra = extra or None
+
+        status = data.get('status') or {}
+        names = data.get('responder_names')
+        if names is None:
+            # Прежний формат: статусы по имени, id ответившего не сохранялся
+            for user_name, value in status.items():
+                record.set_status(None, user_name, value, responded=False)
+        else:
+            record.status = {_share(int(user_id)): _share((names[user_id], value))
+                             for user_id, value in status.items()}
+        return record
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['status'] = {user_id: status for user_id, (_, status) in self.status.items()}
+        data['responder_names'] = {user_id: name for user_id, (name, _) in self.status.items()}
+        data['responded_users'] = sorted(self.responded)
+        if self.extra:
+            data.update(self.extra)
+        return data
+
+    def copy(self):
+        record = TaskRecord.__new__(TaskRecord)
+        for field in self.FIELDS:
+            setattr(record, field, getattr(self, field))
+        record.status = dict(self.status)
+        record.responded = self.responded
+        record.extra = dict(self.extra) if self.extra else None
+        return record
+
+    def set_status(self, user_id, user_name, status, responded=True):
+        if user_id is None:
+            # Без id (старые записи): отрицательный ключ, общий для одинаковых имён
+            user_id = next((key for key, (name, _) in self.status.items() if key < 0 and name == user_name),
+                           min((key for key in self.status if key < 0), default=0) - 1)
+        else:
+            # Запись того же человека из прежнего формата (по имени) заменяется на месте
+            legacy = next((key for key, (name, _) in self.status.items() if key < 0 and name == user_name), None)
+            if legacy is not None:
+                self.status = {user_id if key == legacy else key: value
+                               for key, value in self.status.items() if key != user_id}
+        self.status[_share(user_id)] = _share((user_name, status))
+        if responded and user_id > 0 and user_id not in self.responded:
+            self.responded = _share(self.responded | {user_id})
+
+    def update(self, fields):
+        for key, value in fields.items():
+            if key in self._FIELD_SET:
+                setattr(self, key, value)
+            else:
+                self.extra = dict(self.extra or {}, **{key: value})
+
+    def __getitem__(self, key):
+        if key in self._FIELD_SET:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __eq__(self, other):
+        return isinstance(other, TaskRecord) and self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"TaskRecord({self.to_dict()!r})"
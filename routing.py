@@ -0,0 +1,59 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+ROUTING_FIELDS = ('equipment', 'urgency', 'client_name')
+
+
+def _normalize(text):
+    return str(text).casefold().replace('ё', 'е')
+
+
+class ReceiverRouter:
+    """
+    Выбор получателей задачи по правилам ROUTING_RULES.
+
+    Правило — условия на поля задачи (подстрока без учёта регистра или список
+    подстрок, достаточно любой) и список receivers. Задачу получают все
+    получатели совпавших правил в порядке RECEIVER_USER_IDS; если не совпало
+    ни одно — все получатели. Условия компилируются в регулярные выражения
+    один раз при запуске, неверное правило — ошибка запуска.
+    """
+
+    def __init__(self, rules, all_receivers):
+        self.all_receivers = tuple(all_receivers)
+        self._order = {user_id: i for i, user_id in enumerate(self.all_receivers)}
+        self._rules = []
+        for rule in rules:
+            rule = dict(rule)
+            receivers = frozenset(rule.pop('receivers', ()))
+            unknown = receivers - self._order.keys()
+            if not receivers or unknown:
+                raise ValueError(f"Routing rule {rule}: receivers must be a non-empty subset "
+                                 f"of RECEIVER_USER_IDS (unknown: {sorted(unknown)})")
+            conditions = []
+            for field, patterns in rule.items():
+                if field not in ROUTING_FIELDS:
+                    raise ValueError(f"Routing rule {rule}: unknown field {field!r}")
+                if isinstance(patterns, str):
+                    patterns = [patterns]
+                conditions.append((field, re.compile('|'.join(re.escape(_normalize(p)) for p in patterns))))
+            if not conditions:
+                raise ValueError(f"Routing rule for {sorted(receivers)} has no conditions")
+            self._rules.append((conditions, receivers))
+        if self._rules:
+            logger.info(f"Receiver routing: {len(self._rules)} rules")
+
+    def route(self, task_data):
+        """Кортеж получателей задачи."""
+        if not self._rules:
+            return self.all_receivers
+        values = {field: _normalize(task_data.get(field) or '') for field in ROUTING_FIELDS}
+        matched = set()
+        for conditions, receivers in self._rules:
+            if all(pattern.search(values[field]) for field, pattern in conditions):
+                matched |= receivers
+        if not matched:
+            return self.all_receivers
+        return tuple(sorted(matched, key=self._order.get))
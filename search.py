@@ -0,0 +1,149 @@
+import bisect
+import json
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+SEARCH_FIELDS = ('client_name', 'equipment', 'contact_person', 'what_to_do')
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Слова в нижнем регистре, ё = е; однобуквенные отбрасываются."""
+    if not text:
+        return []
+    return [token for token in _TOKEN_RE.findall(str(text).lower().replace('ё', 'е'))
+            if len(token) > 1]
+
+
+class SearchIndex:
+    """
+    Инвертированный индекс задач: слово -> номера задач, плюс отсортированный
+    словарь слов для поиска по префиксу. Для каждой задачи хранится
+    [sender_id, is_resolved, client_name], чтобы фильтровать и показывать
+    результаты без обращения к состоянию — в том числе для задач из архива.
+    """
+
+    def __init__(self, path='task_index.json'):
+        self.path = path
+        self.postings = {}
+        self.vocabulary = []
+        self.docs = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, task_number):
+        return task_number in self.docs
+
+    def add(self, task_number, task_data):
+        tokens = set()
+        for field in SEARCH_FIELDS:
+            tokens.update(tokenize(task_data.get(field)))
+        with self._lock:
+            for token in tokens:
+                numbers = self.postings.get(token)
+                if numbers is None:
+                    numbers = self.postings[token] = set()
+                    bisect.insort(self.vocabulary, token)
+                numbers.add(task_number)
+            self.docs[task_number] = [task_data.get('sender_id'), bool(task_data.get('is_resolved')),
+                                      task_data.get('client_name')]
+
+    def set_resolved(self, task_number, value):
+        with self._lock:
+            doc = self.docs.get(task_number)
+            if doc:
+                doc[1] = bool(value)
+
+    def is_resolved(self, task_number):
+        doc = self.docs.get(task_number)
+        return doc[1] if doc else None
+
+    def _matching(self, prefix):
+        numbers = set()
+        i = bisect.bisect_left(self.vocabulary, prefix)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(prefix):
+            numbers |= self.postings[self.vocabulary[i]]
+            i += 1
+        return numbers
+
+    def search(self, query, resolved=None, sender_id=None, limit=10):
+        """
+        Номера задач, где каждое слово запроса — начало какого-то слова задачи,
+        от новых к старым. Возвращает (номера, всего найдено). Пустой запрос —
+        все задачи под фильтры; запрос без слов (одна буква, знаки) — ничего.
+        """
+        terms = tokenize(query)
+        if query.strip() and not terms:
+            return [], 0
+        with self._lock:
+            if terms:
+                # Сначала самые редкие слова — пересечение сразу становится маленьким
+                sets = sorted((self._matching(term) for term in terms), key=len)
+                found = set(sets[0])
+                for numbers in sets[1:]:
+                    found &= numbers
+                    if not found:
+                        break
+            else:
+                found = set(self.docs)
+            results = [n for n in found
+                       if (resolved is None or self.docs[n][1] == resolved)
+                       and (sender_id is None or self.docs[n][0] == sender_id)]
+        results.sort(reverse=True)
+        return results[:limit], len(results)
+
+    def load(self):
+        """Читает индекс с диска; False, если файла нет или он повреждён."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.error(f"Error loading search index, rebuilding: {e}")
+            return False
+        with self._lock:
+            self.postings = {token: set(numbers) for token, numbers in data['postings'].items()}
+            self.vocabulary = sorted(self.postings)
+            self.docs = {int(n): doc for n, doc in data['docs'].items()}
+        return True
+
+    def save(self):
+        with self._lock:
+            data = json.dumps({
+                'postings': {token: sorted(numbers) for token, numbers in self.postings.items()},
+                'docs': self.docs
+            }, ensure_ascii=False)
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            logger.error(f"Error saving search index: {e}")
+
+
+def parse_find_query(text, user_id):
+    """
+    Разбирает аргументы /find: слова запроса и фильтры
+    open/открытые, resolved/решённые, mine/мои, from:<user_id>.
+    Возвращает (запрос, resolved, sender_id).
+    """
+    resolved, sender_id, words = None, None, []
+    for word in text.split():
+        lowered = word.lower().replace('ё', 'е')
+        if lowered in ('open', 'открытые'):
+            resolved = False
+        elif lowered in ('resolved', 'решенные'):
+            resolved = True
+        elif lowered in ('mine', 'мои'):
+            sender_id = user_id
+        elif lowered.startswith('from:') and lowered[5:].lstrip('-').isdigit():
+            sender_id = int(lowered[5:])
+        else:
+            words.append(word)
+    return " ".join(words), resolved, sender_id
@@ -0,0 +1,728 @@
+import gzip
+import itertools
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import state_bytes_written
+from records import TaskRecord
+
+logger = logging.getLogger(__name__)
+
+# Снимок JournalStateStore — gzip: строка-заголовок JSON, затем по строке "номер\tJSON задачи"
+GZIP_MAGIC = b'\x1f\x8b'
+# Задач в одной порции записи снимка и в одной выборке SQLite при проходе по задачам
+SNAPSHOT_CHUNK_TASKS = 256
+SCAN_BATCH_TASKS = 256
+
+
+def _seconds_between(start, end):
+    return (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+
+
+def apply_change(state, op, payload):
+    """
+    Применяет одну запись журнала к состоянию (tasks/threads/message_ids/pending_tasks).
+
+    Изменённые записи всегда присваиваются обратно, чтобы хранилища с записью
+    «насквозь» (SQLite) видели изменение, а не только копию в памяти.
+
+    Заодно обновляет счётчики state.stats — за O(1) на запись, без прохода по задачам.
+    """
+    if op == 'task_created':
+        task_number = payload['task_number']
+        task = TaskRecord.from_dict(payload['task'])
+        state.tasks[task_number] = task
+        state.task_counter = max(state.task_counter, task_number + 1)
+        state.stats.add('', 'open')
+        if task.created_at:
+            state.stats.add(task.created_at[:10], 'created')
+    elif op == 'task_updated':
+        task_number = payload['task_number']
+        task = state.tasks[task_number]
+        task.update(payload['fields'])
+        state.tasks[task_number] = task
+    elif op == 'task_published':
+        task_number = payload['task_number']
+        state.threads[task_number] = payload['thread_id']
+        state.message_ids[task_number] = payload['message_id']
+        # Тема только что создана открытой — от этого отсчитывается сверка при запуске
+        task = state.tasks[task_number]
+        task.topic_resolved = False
+        state.tasks[task_number] = task
+    elif op == 'status_set':
+        task_number = payload['task_number']
+        task = state.tasks[task_number]
+        user_id = payload.get('user_id')
+        responded = payload.get('responded', user_id is not None)
+        first_reply = responded and user_id not in task.responded
+        task.set_status(user_id, payload['user_name'], payload['status'], responded=responded)
+        state.tasks[task_number] = task
+        at = payload.get('at')
+        if at and user_id is not None:
+            state.stats.add(at[:10], f"status|{user_id}|{payload['status']}")
+            # Имя рядом со счётчиками: /stats не зависит от кэша профилей
+            state.stats.add(at[:10], f"name|{user_id}|{payload['user_name']}")
+            if first_reply and task.created_at:
+                state.stats.add(at[:10], f"replies|{user_id}")
+                state.stats.add(at[:10], f"reply_seconds|{user_id}", _seconds_between(task.created_at, at))
+    elif op == 'resolved':
+        task_number = payload['task_number']
+        task = state.tasks[task_number]
+        changed = bool(task.is_resolved) != bool(payload['value'])
+        task.is_resolved = payload['value']
+        task.resolved_at = payload.get('at') if payload['value'] else None
+        state.tasks[task_number] = task
+        at = payload.get('at')
+        if changed:
+            state.stats.add('', 'open', -1 if payload['value'] else 1)
+        if changed and at:
+            if not payload['value']:
+                state.stats.add(at[:10], 'reopened')
+            else:
+                state.stats.add(at[:10], 'resolved')
+                if task.created_at:
+                    state.stats.add(at[:10], 'resolve_count')
+                    state.stats.add(at[:10], 'resolve_seconds', _seconds_between(task.created_at, at))
+    elif op == 'task_archived':
+        task_number = payload['task_number']
+        state.threads.pop(task_number, None)
+        state.message_ids.pop(task_number, None)
+        state.tasks.pop(task_number, None)
+    elif op == 'task_restored':
+        task_number = payload['task_number']
+        state.tasks[task_number] = TaskRecord.from_dict(payload['task'])
+        if payload.get('thread_id') is not None:
+            state.threads[task_number] = payload['thread_id']
+        if payload.get('message_id') is not None:
+            state.message_ids[task_number] = payload['message_id']
+    elif op == 'draft_started':
+        state.pending_tasks[payload['chat_id']] = payload['draft']
+    elif op == 'draft_field':
+        chat_id = payload['chat_id']
+        draft = state.pending_tasks[chat_id]
+        draft[payload['field']] = payload['value']
+        state.pending_tasks[chat_id] = draft
+    elif op == 'draft_dropped':
+        state.pending_tasks.pop(payload['chat_id'], None)
+    else:
+        raise ValueError(f"Unknown journal op: {op}")
+
+
+class StatsCounters:
+    """
+    Накопительные счётчики статистики: день (YYYY-MM-DD) -> {метрика: значение}.
+    День '' — значения за всё время, например число открытых задач.
+    """
+
+    def __init__(self, days=None):
+        self.days = days or {}
+
+    def add(self, day, metric, value=1):
+        counters = self.days.setdefault(day, {})
+        counters[metric] = counters.get(metric, 0) + value
+
+    def get(self, day, metric):
+        return self.days.get(day, {}).get(metric, 0)
+
+    def day(self, day):
+        return dict(self.days.get(day, {}))
+
+
+class LazyTaskMap(MutableMapping):
+    """
+    tasks для JournalStateStore: задачи из снимка лежат строками JSON и
+    становятся TaskRecord при первом обращении, поэтому загрузка снимка не
+    разбирает каждую задачу. Нетронутые задачи и в следующий снимок
+    пишутся той же строкой, без повторной сериализации: строка разобранной
+    задачи хранится, пока задачу не перезапишут (apply_change всегда
+    присваивает изменённую запись обратно).
+    """
+
+    def __init__(self, raw=None, records=None):
+        self._raw = raw or {}
+        self._records = records or {}
+        # Строки JSON разобранных задач, которые с тех пор не менялись
+        self._lines = {}
+        # Задачи, перезаписанные после последнего snapshot()
+        self._changed = set()
+        self._lock = threading.Lock()
+
+    def __getitem__(self, task_number):
+        record = self._records.get(task_number)
+        if record is not None:
+            return record
+        with self._lock:
+            record = self._records.get(task_number)
+            if record is None:
+                # Строку забираем под блокировкой: задачу разберёт ровно один поток
+                line = self._raw.pop(task_number)
+                record = TaskRecord.from_dict(json.loads(line))
+                self._records[task_number] = record
+                self._lines[task_number] = line
+        return record
+
+    def __setitem__(self, task_number, record):
+        with self._lock:
+            self._raw.pop(task_number, None)
+            self._lines.pop(task_number, None)
+            self._changed.add(task_number)
+            self._records[task_number] = record
+
+    def __delitem__(self, task_number):
+        with self._lock:
+            self._lines.pop(task_number, None)
+            if self._records.pop(task_number, None) is None:
+                del self._raw[task_number]
+
+    def __contains__(self, task_number):
+        return task_number in self._records or task_number in self._raw
+
+    def __iter__(self):
+        with self._lock:
+            numbers = list(itertools.chain(self._records, self._raw))
+        return iter(numbers)
+
+    def __len__(self):
+        return len(self._records) + len(self._raw)
+
+    @property
+    def undecoded(self):
+        return len(self._raw)
+
+    def scan(self):
+        """
+        (номер, задача) для проходов по всем задачам: разобранные отдаются как
+        TaskRecord, остальные — словарем из строки JSON, который нигде не
+        остаётся, так что проход не разбирает всю историю в память. Задачу
+        читать только через .get(); удалённые по ходу прохода пропускаются.
+        """
+        for task_number in list(self):
+            with self._lock:
+                task = self._records.get(task_number)
+                line = self._raw.get(task_number) if task is None else None
+            if task is not None:
+                yield task_number, task
+            elif line is not None:
+                yield task_number, json.loads(line)
+
+    def snapshot(self):
+        """
+        Задачи для снимка: ([(номер, JSON)] нетронутых, {номер: копия} изменённых).
+        Копий не больше, чем записей журнала с прошлого снимка; сериализует их
+        вызывающий уже без блокировки хранилища и возвращает через remember_lines.
+        """
+        with self._lock:
+            self._changed.clear()
+            changed = {task_number: record.copy() for task_number, record in self._records.items()
+                       if task_number not in self._lines}
+            return list(itertools.chain(self._lines.items(), self._raw.items())), changed
+
+    def remember_lines(self, lines):
+        """Запоминает JSON задач из snapshot(), если их не изменили, пока шла сериализация."""
+        with self._lock:
+            for task_number, line in lines.items():
+                if task_number in self._records and task_number not in self._changed:
+                    self._lines[task_number] = line
+
+
+class JournalStateStore:
+    """
+    Снимок состояния (task_state.json) + append-only журнал изменений.
+
+    Каждая мутация дописывает одну строку в журнал, поэтому стоимость записи
+    не зависит от объёма истории. Раз в compact_every записей журнал
+    сворачивается в новый снимок — в фоновом потоке, который запускает load():
+    записавший поток (и цикл событий async_bot.py) снимок не ждёт.
+
+    Снимок пишется сжатым построчным форматом (см. GZIP_MAGIC), задачи из
+    него разбираются лениво (LazyTaskMap). Прежний снимок-JSON читается
+    как раньше и при первом сворачивании переписывается в новом формате.
+    """
+
+    def __init__(self, path='task_state.json', journal_path=None, compact_every=500, fsync=False):
+        self.path = path
+        self.journal_path = journal_path or f"{os.path.splitext(path)[0]}.journal"
+        self.compact_every = compact_every
+        self.fsync = fsync
+        self.task_counter = 1
+        self.tasks = LazyTaskMap()
+        self.threads = {}
+        self.message_ids = {}
+        self.pending_tasks = {}
+        self.stats = StatsCounters()
+        self._seq = 0
+        self._journal_records = 0
+        self._journal = None
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        self._compact_requested = threading.Event()
+        self._compactor = None
+        self._closed = False
+
+    def load(self):
+        snapshot_seq = 0
+        try:
+            with open(self.path, 'rb') as f:
+                if f.read(2) == GZIP_MAGIC:
+                    f.seek(0)
+                    data, tasks = self._read_snapshot(f)
+                else:
+                    f.seek(0)
+                    data = json.load(f)
+                    tasks = LazyTaskMap(records={int(k): TaskRecord.from_dict(v)
+                                                 for k, v in data.get('tasks', {}).items()})
+            self.task_counter = data.get('task_counter', 1)
+            self.tasks = tasks
+            self.threads = {int(k): v for k, v in data.get('threads', {}).items()}
+            self.message_ids = {int(k): v for k, v in data.get('message_ids', {}).items()}
+            self.pending_tasks = {int(k): v for k, v in data.get('pending_tasks', {}).items()}
+            snapshot_seq = data.get('journal_seq', 0)
+            if 'stats' in data:
+                self.stats = StatsCounters(data['stats'])
+            else:
+                # Снимок старше статистики: историю не восстановить, но открытые задачи посчитать можно
+                self.stats = StatsCounters()
+                self.stats.add('', 'open', sum(1 for _, task in self.tasks.scan() if not task.get('is_resolved')))
+        except FileNotFoundError:
+            logger.info("State file not found. Starting fresh.")
+
+        self._seq = snapshot_seq
+        # .old остаётся, если процесс упал во время сворачивания журнала
+        replayed = self._replay(self._rotated_journal_path)
+        replayed += self._replay(self.journal_path)
+        if replayed:
+            logger.info(f"Replayed {replayed} journal records.")
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._closed = False
+        self._compactor = threading.Thread(target=self._run_compactor, name='state-compactor', daemon=True)
+        self._compactor.start()
+
+    @staticmethod
+    def _read_snapshot(f):
+        with gzip.open(f, 'rt', encoding='utf-8') as lines:
+            data = json.loads(next(lines))
+            raw = {}
+            for line in lines:
+                task_number, _, task = line.rstrip('\n').partition('\t')
+                raw[int(task_number)] = task
+        return data, LazyTaskMap(raw=raw)
+
+    @property
+    def _rotated_journal_path(self):
+        return f"{self.journal_path}.old"
+
+    def _replay(self, journal_path):
+        replayed = 0
+        try:
+            with open(journal_path, 'r+b') as f:
+                valid_bytes = 0
+                for line_no, line in enumerate(f, 1):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Обрыв записи при падении процесса: всё после него недостоверно.
+                        # Обрывок отрезается, иначе новые записи допишутся к нему в ту же строку
+                        logger.error(f"Corrupted journal record at line {line_no}, truncating journal")
+                        f.truncate(valid_bytes)
+                        break
+                    if not line.endswith(b"\n"):
+                        # Последняя запись целая, но без перевода строки
+                        f.seek(0, os.SEEK_END)
+                        f.write(b"\n")
+                    valid_bytes += len(line)
+                    self._journal_records += 1
+                    if record['seq'] <= self._seq:
+                        continue
+                    try:
+                        apply_change(self, record['op'], record['data'])
+                    except (KeyError, ValueError) as e:
+                        logger.error(f"Error replaying journal record {record['seq']}: {e}")
+                    self._seq = record['seq']
+                    replayed += 1
+        except FileNotFoundError:
+            pass
+        return replayed
+
+    def record(self, op, **payload):
+        """Применяет изменение в памяти и дописывает его в журнал."""
+        with self._lock:
+            apply_change(self, op, payload)
+            self._seq += 1
+            line = json.dumps({'seq': self._seq, 'op': op, 'data': payload}, ensure_ascii=False)
+            try:
+                self._journal.write(line + "\n")
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+                state_bytes_written.inc(len(line.encode('utf-8')) + 1, kind='journal')
+            except Exception as e:
+                logger.error(f"Error writing journal: {e}")
+            self._journal_records += 1
+            if self._journal_records >= self.compact_every:
+                self._compact_requested.set()
+
+    def _run_compactor(self):
+        while True:
+            self._compact_requested.wait()
+            if self._closed:
+                return
+            self._compact_requested.clear()
+            self.compact()
+
+    def compact(self):
+        """
+        Записывает полный снимок атомарно и обнуляет журнал.
+
+        Под блокировкой берутся только строки и копии задач (LazyTaskMap.snapshot)
+        и копии небольших словарей, а журнал переименовывается в .old — это
+        согласованная точка снимка. Сериализация, сжатие и fsync идут уже без
+        блокировки, новые мутации попадают в свежий журнал.
+        """
+        if not self._compact_lock.acquire(blocking=False):
+            return  # сворачивание уже идёт в другом потоке
+        try:
+            with self._lock:
+                header = {
+                    'task_counter': self.task_counter,
+                    'threads': dict(self.threads),
+                    'message_ids': dict(self.message_ids),
+                    'pending_tasks': {chat_id: dict(draft) for chat_id, draft in self.pending_tasks.items()},
+                    'stats': {day: dict(counters) for day, counters in self.stats.days.items()},
+                    'journal_seq': self._seq
+                }
+                tasks, changed = self.tasks.snapshot()
+                if self._journal is not None:
+                    self._journal.close()
+                    self._rotate_journal()
+                    self._journal = open(self.journal_path, 'a', encoding='utf-8')
+                self._journal_records = 0
+
+            changed = {task_number: json.dumps(record.to_dict(), ensure_ascii=False)
+                       for task_number, record in changed.items()}
+            self.tasks.remember_lines(changed)
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    # Пишем порциями, а не одной строкой на весь снимок: поток
+                    # не держит GIL подолгу, обработчики продолжают работать
+                    with gzip.GzipFile(fileobj=f, mode='wb', compresslevel=1) as snapshot:
+                        snapshot.write((json.dumps(header, ensure_ascii=False) + "\n").encode('utf-8'))
+                        lines = itertools.chain(tasks, changed.items())
+                        while chunk := list(itertools.islice(lines, SNAPSHOT_CHUNK_TASKS)):
+                            snapshot.write("".join(f"{task_number}\t{task}\n"
+                                                   for task_number, task in chunk).encode('utf-8'))
+                    f.flush()
+                    os.fsync(f.fileno())
+                    written = f.tell()
+                os.replace(tmp_path, self.path)
+            except Exception as e:
+                logger.error(f"Error saving state: {e}")
+                return
+            state_bytes_written.inc(written, kind='snapshot')
+
+            try:
+                os.remove(self._rotated_journal_path)
+            except FileNotFoundError:
+                pass
+            logger.info("State saved successfully.")
+        finally:
+            self._compact_lock.release()
+
+    def _rotate_journal(self):
+        if not os.path.exists(self._rotated_journal_path):
+            os.replace(self.journal_path, self._rotated_journal_path)
+            return
+        # Предыдущий снимок не записался: его записи ещё нужны, дописываем к ним
+        with open(self.journal_path, 'r', encoding='utf-8') as src, \
+                open(self._rotated_journal_path, 'a', encoding='utf-8') as dst:
+            dst.write(src.read())
+        os.remove(self.journal_path)
+
+    def close(self):
+        self._closed = True
+        self._compact_requested.set()
+        if self._compactor is not None and self._compactor is not threading.current_thread():
+            self._compactor.join()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+
+class _SqliteTaskMap(MutableMapping):
+    """task_number -> dict задачи; каждая операция читает или пишет одну строку."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, task_number):
+        row = self._store._query_one("SELECT data FROM tasks WHERE number = ?", (task_number,))
+        if row is None:
+            raise KeyError(task_number)
+        return TaskRecord.from_dict(json.loads(row[0]))
+
+    def __setitem__(self, task_number, task):
+        self._store._execute(
+            "INSERT INTO tasks (number, sender_id, is_resolved, data) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(number) DO UPDATE SET sender_id = excluded.sender_id, "
+            "is_resolved = excluded.is_resolved, data = excluded.data",
+            (task_number, task.sender_id, int(bool(task.is_resolved)),
+             json.dumps(task.to_dict(), ensure_ascii=False))
+        )
+
+    def __delitem__(self, task_number):
+        if not self._store._execute("DELETE FROM tasks WHERE number = ?", (task_number,)).rowcount:
+            raise KeyError(task_number)
+
+    def __contains__(self, task_number):
+        return self._store._query_one(
+            "SELECT 1 FROM tasks WHERE number = ?", (task_number,)) is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self._store._query_all("SELECT number FROM tasks ORDER BY number")])
+
+    def __len__(self):
+        return self._store._query_one("SELECT COUNT(*) FROM tasks")[0]
+
+    def scan(self):
+        """(номер, dict задачи) порциями по SCAN_BATCH_TASKS, как LazyTaskMap.scan."""
+        last = 0
+        while rows := self._store._query_all(
+                "SELECT number, data FROM tasks WHERE number > ? ORDER BY number LIMIT ?",
+                (last, SCAN_BATCH_TASKS)):
+            for task_number, data in rows:
+                yield task_number, json.loads(data)
+            last = rows[-1][0]
+
+
+class _SqliteColumnMap(MutableMapping):
+    """task_number -> значение одной колонки таблицы tasks (thread_id, message_id)."""
+
+    def __init__(self, store, column):
+        self._store = store
+        self._column = column
+
+    def __getitem__(self, task_number):
+        row = self._store._query_one(
+            f"SELECT {self._column} FROM tasks WHERE number = ?", (task_number,))
+        if row is None or row[0] is None:
+            raise KeyError(task_number)
+        return row[0]
+
+    def __setitem__(self, task_number, value):
+        self._store._execute(
+            f"UPDATE tasks SET {self._column} = ? WHERE number = ?", (value, task_number))
+
+    def __delitem__(self, task_number):
+        if not self._store._execute(
+                f"UPDATE tasks SET {self._column} = NULL WHERE number = ? AND {self._column} IS NOT NULL",
+                (task_number,)).rowcount:
+            raise KeyError(task_number)
+
+    def __iter__(self):
+        return iter([row[0] for row in self._store._query_all(
+            f"SELECT number FROM tasks WHERE {self._column} IS NOT NULL ORDER BY number")])
+
+    def __len__(self):
+        return self._store._query_one(
+            f"SELECT COUNT({self._column}) FROM tasks")[0]
+
+
+class _SqliteDraftMap(MutableMapping):
+    """chat_id -> черновик задачи."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, chat_id):
+        row = self._store._query_one("SELECT data FROM drafts WHERE chat_id = ?", (chat_id,))
+        if row is None:
+            raise KeyError(chat_id)
+        return json.loads(row[0])
+
+    def __setitem__(self, chat_id, draft):
+        self._store._execute(
+            "INSERT OR REPLACE INTO drafts (chat_id, data) VALUES (?, ?)",
+            (chat_id, json.dumps(draft, ensure_ascii=False)))
+
+    def __delitem__(self, chat_id):
+        if not self._store._execute("DELETE FROM drafts WHERE chat_id = ?", (chat_id,)).rowcount:
+            raise KeyError(chat_id)
+
+    def __contains__(self, chat_id):
+        return self._store._query_one(
+            "SELECT 1 FROM drafts WHERE chat_id = ?", (chat_id,)) is not None
+
+    def __iter__(self):
+        return iter([row[0] for row in self._store._query_all("SELECT chat_id FROM drafts")])
+
+    def __len__(self):
+        return self._store._query_one("SELECT COUNT(*) FROM drafts")[0]
+
+
+class _SqliteStats:
+    """StatsCounters поверх таблицы stats: прибавление — один UPSERT."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def add(self, day, metric, value=1):
+        self._store._execute(
+            "INSERT INTO stats (day, metric, value) VALUES (?, ?, ?) "
+            "ON CONFLICT(day, metric) DO UPDATE SET value = value + excluded.value",
+            (day, metric, value))
+
+    def get(self, day, metric):
+        row = self._store._query_one(
+            "SELECT value FROM stats WHERE day = ? AND metric = ?", (day, metric))
+        return row[0] if row else 0
+
+    def day(self, day):
+        return dict(self._store._query_all("SELECT metric, value FROM stats WHERE day = ?", (day,)))
+
+
+class SqliteStateStore:
+    """
+    Хранилище состояния в SQLite (WAL). В памяти ничего не накапливается:
+    tasks/threads/message_ids/pending_tasks — отображения поверх таблиц,
+    каждая мутация — одна транзакция над одной строкой.
+
+    При первом запуске импортирует существующий task_state.json (+ журнал).
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            number INTEGER PRIMARY KEY,
+            sender_id INTEGER,
+            is_resolved INTEGER NOT NULL DEFAULT 0,
+            thread_id INTEGER,
+            message_id INTEGER,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_sender_id ON tasks (sender_id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_is_resolved ON tasks (is_resolved);
+        CREATE INDEX IF NOT EXISTS idx_tasks_thread_id ON tasks (thread_id);
+        CREATE TABLE IF NOT EXISTS drafts (
+            chat_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS stats (
+            day TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            value REAL NOT NULL,
+            PRIMARY KEY (day, metric)
+        );
+    """
+
+    def __init__(self, path='task_state.db', migrate_from=None):
+        self.path = path
+        self.migrate_from = migrate_from
+        self._lock = threading.RLock()
+        self._conn = None
+        self.tasks = _SqliteTaskMap(self)
+        self.threads = _SqliteColumnMap(self, 'thread_id')
+        self.message_ids = _SqliteColumnMap(self, 'message_id')
+        self.pending_tasks = _SqliteDraftMap(self)
+        self.stats = _SqliteStats(self)
+
+    def load(self):
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(self.SCHEMA)
+        if self._get_meta('stats_since') is None:
+            with self._transaction():
+                open_tasks = self._query_one("SELECT COUNT(*) FROM tasks WHERE is_resolved = 0")[0]
+                self.stats.add('', 'open', open_tasks)
+                self._set_meta('stats_since', datetime.now().isoformat())
+        if self.migrate_from and self._get_meta('migrated_from') is None:
+            journal_path = f"{os.path.splitext(self.migrate_from)[0]}.journal"
+            if os.path.exists(self.migrate_from) or os.path.exists(journal_path):
+                self.import_json_state(self.migrate_from)
+
+    def import_json_state(self, path, journal_path=None):
+        """Импортирует снимок task_state.json вместе с его журналом."""
+        legacy = JournalStateStore(path, journal_path)
+        legacy.load()
+        legacy.close()
+        with self._transaction():
+            for task_number, task in legacy.tasks.items():
+                self.tasks[task_number] = task
+            for task_number, thread_id in legacy.threads.items():
+                self.threads[task_number] = thread_id
+            for task_number, message_id in legacy.message_ids.items():
+                self.message_ids[task_number] = message_id
+            for chat_id, draft in legacy.pending_tasks.items():
+                self.pending_tasks[chat_id] = draft
+            for day, counters in legacy.stats.days.items():
+                for metric, value in counters.items():
+                    self.stats.add(day, metric, value)
+            self.task_counter = max(self.task_counter, legacy.task_counter)
+            self._set_meta('migrated_from', path)
+        logger.info(f"Imported {len(legacy.tasks)} tasks from {path}")
+
+    @property
+    def task_counter(self):
+        return int(self._get_meta('task_counter') or 1)
+
+    @task_counter.setter
+    def task_counter(self, value):
+        self._set_meta('task_counter', value)
+
+    def record(self, op, **payload):
+        with self._transaction():
+            apply_change(self, op, payload)
+
+    def compact(self):
+        try:
+            with self._lock:
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            logger.info("State saved successfully.")
+        except Exception as e:
+            logger.error(f"Error saving state: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _query_one(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()
+
+    def _query_all(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _get_meta(self, key):
+        row = self._query_one("SELECT value FROM meta WHERE key = ?", (key,))
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
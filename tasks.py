@@ -0,0 +1,868 @@
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+
+from telebot import types
+
+from archive import TaskArchive
+from cache import LRUCache, TTLCache
+from config import (RECEIVER_USER_IDS, DRAFT_FILE, DRAFT_TTL_MINUTES, INFO_CHAT_ID, STATE_BACKEND, STATE_FILE,
+                    STATE_JOURNAL_FILE, STATE_COMPACT_EVERY, STATE_DB_FILE, RENDER_CACHE_SIZE,
+                    REMINDER_DELAY_MINUTES, UNANSWERED_NOTIFY_DELAY_MINUTES, REMINDER_MODE,
+                    USER_PROFILE_CACHE_SIZE, USER_PROFILE_TTL, ARCHIVE_FILE, ARCHIVE_AFTER_DAYS,
+                    SEARCH_INDEX_FILE, FIND_RESULTS_LIMIT, STATS_DEFAULT_DAYS, STATS_MAX_DAYS,
+                    ROUTING_RULES)
+from drafts import DraftStore
+from gateway import PRIORITY_BACKGROUND
+from metrics import save_state_latency, tasks_created, tasks_resolved, tasks_archived, timers_fired
+from routing import ReceiverRouter
+from search import SearchIndex, parse_find_query, tokenize
+from storage import JournalStateStore, SqliteStateStore
+
+logger = logging.getLogger(__name__)
+
+TASK_FIELDS = [
+    ('client_name', "Название клиента"),
+    ('urgency', "Срочность задачи"),
+    ('what_to_do', "Что нужно сделать"),
+    ('goal', "Цель работы"),
+    ('client_pp', "ПП клиента"),
+    ('equipment', "Оборудование (марка, модель)"),
+    ('cost_and_hours', "Сумма и количество часов"),
+    ('contact_person', "Контактное лицо (ФИО и номера)"),
+    ('photo', "Фото задачи (или пропустите)")
+]
+TASK_FIELD_NAMES = [field for field, _ in TASK_FIELDS]
+TASK_FIELD_PROMPTS = dict(TASK_FIELDS)
+# Номер шага мастера по полю: курсор черновика после заполнения поля — следующий номер
+TASK_FIELD_STEPS = {field: step for step, field in enumerate(TASK_FIELD_NAMES)}
+
+STATUS_MAP = {
+    'take': 'готов взять задачу',
+    'no_competence': 'не уверен, нужны уточнения',
+    'cant_take': 'не может взять задачу'
+}
+
+# Поля задачи со сроками отложенных действий (ISO datetime или None)
+TIMER_FIELDS = ('reminder_at', 'notify_at')
+
+ICON_COLOR = 7322096
+MAX_TOPIC_LENGTH = 20
+MAX_MESSAGE_LENGTH = 4096
+
+FIND_USAGE = (
+    "Поиск задач: /find <слова> [open|resolved] [mine|from:<id>]\n"
+    "Ищет по клиенту, оборудованию, контактам и описанию задачи; "
+    "слово можно писать началом: /find cisc открытые"
+)
+
+STATS_USAGE = f"Статистика: /stats [дней], по умолчанию {STATS_DEFAULT_DAYS}, не больше {STATS_MAX_DAYS}"
+
+# Число полос блокировок: задачи с разными номерами почти всегда блокируют разные полосы
+LOCK_STRIPES = 64
+
+
+class TaskState(ABC):
+    """
+    Состояние задач и всё, что не зависит от способа общения с Bot API:
+    мутации через хранилище, отрисовка сообщений и клавиатур, сроки таймеров,
+    решения по кнопкам, напоминаниям и сверке после запуска.
+
+    Вызовы API, результата которых ждать не нужно (рассылка получателям,
+    напоминания, правки тем и сообщений), ставятся в outbox и edit_coalescer
+    движка: сбой не теряет сообщение. Синхронный (bot.py) и асинхронный
+    (async_bot.py) движки наследуются от него и сами выполняют только вызовы,
+    ответ на которые нужен сразу; такие вызовы TaskState возвращает как
+    (имя_метода, kwargs). Без outbox и edit_coalescer (тесты, бенчмарки)
+    работает всё, кроме исходящих вызовов.
+    """
+
+    def __init__(self, outbox=None, edit_coalescer=None):
+        self.outbox = outbox
+        self.edit_coalescer = edit_coalescer
+        if STATE_BACKEND == 'sqlite':
+            self.store = SqliteStateStore(STATE_DB_FILE, migrate_from=STATE_FILE)
+        else:
+            self.store = JournalStateStore(
+                STATE_FILE, STATE_JOURNAL_FILE, compact_every=STATE_COMPACT_EVERY)
+        self.archive = TaskArchive(ARCHIVE_FILE)
+        self.search_index = SearchIndex(SEARCH_INDEX_FILE)
+        self.drafts = DraftStore(DRAFT_FILE, ttl=DRAFT_TTL_MINUTES * 60)
+        self.router = ReceiverRouter(ROUTING_RULES, RECEIVER_USER_IDS)
+        # Версия задачи растёт при каждом изменении и входит в ключ кэша отрисовки
+        self._versions = {}
+        self._render_cache = LRUCache(RENDER_CACHE_SIZE)
+        self._keyboard_cache = LRUCache(RENDER_CACHE_SIZE)
+        self._task_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._draft_locks = [threading.RLock() for _ in range(LOCK_STRIPES)]
+        self._counter_lock = threading.Lock()
+        self._load_state()
+
+    def task_lock(self, task_number):
+        """Блокировка задачи: проверка и изменение её состояния должны идти под ней."""
+        return self._task_locks[hash(task_number) % LOCK_STRIPES]
+
+    def draft_lock(self, chat_id):
+        """
+        Блокировка черновика: сообщения одного отправителя могут попасть в разные
+        потоки обработчиков. Держится только на время работы с черновиком —
+        полоса общая для нескольких отправителей, вызовам API под ней не место.
+        """
+        return self._draft_locks[hash(chat_id) % LOCK_STRIPES]
+
+    def get_task_snapshot(self, task_number):
+        """Копия задачи, которую можно читать без блокировки (или None)."""
+        with self.task_lock(task_number):
+            task_data = self.tasks.get(task_number)
+            return task_data.copy() if task_data else None
+
+    @property
+    def tasks(self):
+        return self.store.tasks
+
+    @property
+    def threads(self):
+        return self.store.threads  # Хранит task_number: thread_id
+
+    @property
+    def message_ids(self):
+        return self.store.message_ids  # Хранит task_number: message_id
+
+    @property
+    def task_counter(self):
+        return self.store.task_counter
+
+    def _load_state(self):
+        try:
+            self.store.load()
+            logger.info(
+                f"State loaded successfully. Tasks: {len(self.tasks)}, Threads: {len(self.threads)}, Messages: {len(self.message_ids)}")
+        except Exception as e:
+            logger.error(f"Error loading state: {e}")
+        self.drafts.load()
+        self._migrate_drafts()
+
+    def reconcile(self):
+        """
+        Фоновый проход после запуска, пока бот уже принимает обновления:
+        догоняет поисковый индекс, заново ставит таймеры и возвращает номера
+        задач, у которых тема форума разошлась с is_resolved (бот остановился
+        между записью состояния и вызовом API).
+        """
+        self._sync_search_index()
+        self.rearm_timers()
+        drifted = []
+        for task_number, task_data in self.tasks.scan():
+            topic_resolved = task_data.get('topic_resolved')
+            if (task_number in self.threads and topic_resolved is not None
+                    and topic_resolved != bool(task_data.get('is_resolved'))):
+                drifted.append(task_number)
+        return drifted
+
+    def repair_topics(self, drifted):
+        """Доводит темы форума из reconcile() до состояния задач через outbox."""
+        for task_number in drifted:
+            task_data = self.get_task_snapshot(task_number)
+            thread_id = self.threads.get(task_number)
+            if not task_data or not thread_id:
+                continue
+            resolved = bool(task_data.is_resolved)
+            self.outbox.put('close_forum_topic' if resolved else 'reopen_forum_topic', key=f"topic_state:{thread_id}",
+                            priority=PRIORITY_BACKGROUND, chat_id=INFO_CHAT_ID, message_thread_id=thread_id)
+            self.outbox.put('edit_forum_topic', key=f"topic_name:{thread_id}", priority=PRIORITY_BACKGROUND,
+                            chat_id=INFO_CHAT_ID, message_thread_id=thread_id,
+                            name=self.topic_name(task_number, task_data, "🟢" if resolved else "🔴"))
+            self.update_forum_message(task_number)
+            self.update_main_chat_status(task_number)
+            self.set_topic_resolved(task_number, resolved)
+        if drifted:
+            logger.info(f"Reconciled {len(drifted)} forum topics after downtime")
+
+    def set_topic_resolved(self, task_number, value):
+        """Запоминает состояние, до которого доведена тема форума."""
+        self._record('task_updated', task_number=task_number, fields={'topic_resolved': value})
+
+    def _migrate_drafts(self):
+        """Черновики из прежнего формата (в состоянии задач) переносит в отдельное хранилище."""
+        for chat_id, draft in list(self.store.pending_tasks.items()):
+            if chat_id not in self.drafts:
+                step = next((i for i, field in enumerate(TASK_FIELD_NAMES) if draft.get(field) is None),
+                            len(TASK_FIELD_NAMES))
+                self.drafts.start(chat_id, draft, step)
+            self._record('draft_dropped', chat_id=chat_id)
+
+    def _sync_search_index(self):
+        """Догоняет индекс до состояния: файл индекса мог отстать после аварийной остановки."""
+        if not self.search_index.load():
+            for record in self.archive:
+                self.search_index.add(record['task_number'], record['task'])
+        added = 0
+        for task_number, task_data in self.tasks.scan():
+            if task_number not in self.search_index:
+                self.search_index.add(task_number, task_data)
+                added += 1
+            elif self.search_index.is_resolved(task_number) != bool(task_data.get('is_resolved')):
+                self.search_index.set_resolved(task_number, task_data.get('is_resolved'))
+        if added:
+            logger.info(f"Search index: added {added} tasks")
+
+    def save_state(self):
+        with save_state_latency.time():
+            self.store.compact()
+        self.search_index.save()
+        self.drafts.save()
+
+    def _record(self, op, **payload):
+        task_number = payload.get('task_number')
+        if task_number is None:
+            self.store.record(op, **payload)
+            return
+        with self.task_lock(task_number):
+            self.store.record(op, **payload)
+            self._versions[task_number] = self._versions.get(task_number, 0) + 1
+
+    def set_status(self, task_number, user_name, status, user_id=None, responded=True):
+        """responded=False — статус без ответа получателя (например, «беру» в форуме)."""
+        self._record('status_set', task_number=task_number, user_name=user_name,
+                     status=status, user_id=user_id, responded=responded,
+                     at=datetime.now().isoformat())
+        return self.tasks[task_number]
+
+    def try_set_resolved(self, task_number, value):
+        """Атомарно меняет is_resolved; False, если задача уже в этом состоянии."""
+        with self.task_lock(task_number):
+            if self.tasks[task_number]['is_resolved'] == value:
+                return False
+            self._record('resolved', task_number=task_number, value=value,
+                         at=datetime.now().isoformat())
+            self.search_index.set_resolved(task_number, value)
+        if value:
+            tasks_resolved.inc()
+        return True
+
+    def archive_resolved(self, max_age_days=ARCHIVE_AFTER_DAYS):
+        """
+        Переносит задачи, решённые раньше max_age_days назад, в архив и
+        убирает их из tasks/threads/message_ids. Возвращает число задач.
+        """
+        cutoff = (datetime.now() - timedelta(days=max_age_days)).isoformat()
+        records = []
+        for task_number, task_data in self.tasks.scan():
+            if not task_data.get('is_resolved'):
+                continue
+            if any(task_data.get(field) for field in TIMER_FIELDS):
+                continue
+            # У задач, решённых до появления resolved_at, возраст неизвестен — они старые
+            if (task_data.get('resolved_at') or '') > cutoff:
+                continue
+            # Разбирается только задача, которая уходит в архив
+            task_data = self.get_task_snapshot(task_number)
+            if not task_data:
+                continue
+            records.append({
+                'task_number': task_number,
+                'task': task_data.to_dict(),
+                'thread_id': self.threads.get(task_number),
+                'message_id': self.message_ids.get(task_number),
+                'archived_at': datetime.now().isoformat()
+            })
+        if not records:
+            return 0
+
+        # Сначала архив на диске, потом удаление из состояния: при сбое между
+        # шагами задача останется в обоих местах, но не потеряется
+        self.archive.append(records)
+        archived = 0
+        for record in records:
+            task_number = record['task_number']
+            with self.task_lock(task_number):
+                task_data = self.tasks.get(task_number)
+                if not task_data or not task_data.get('is_resolved'):
+                    continue  # задачу успели вернуть в работу
+                self._record('task_archived', task_number=task_number)
+                archived += 1
+        tasks_archived.inc(archived)
+        # Архивные задачи остаются в поиске — индекс на диске должен их уже знать
+        self.search_index.save()
+        logger.info(f"Archived {archived} resolved tasks to {self.archive.path}")
+        return archived
+
+    def restore_archived_task(self, task_number):
+        """Возвращает задачу из архива в рабочее состояние; None, если её там нет."""
+        with self.task_lock(task_number):
+            task_data = self.tasks.get(task_number)
+            if task_data:
+                return task_data
+            record = self.archive.find(task_number)
+            if record is None:
+                return None
+            self._record('task_restored', task_number=task_number, task=record['task'],
+                         thread_id=record['thread_id'], message_id=record['message_id'])
+            logger.info(f"Task #{task_number} restored from archive")
+            return self.tasks[task_number]
+
+    def find_tasks(self, text, user_id, limit=FIND_RESULTS_LIMIT):
+        """Текст ответа на /find."""
+        query, resolved, sender_id = parse_find_query(text, user_id)
+        if not tokenize(query) and resolved is None and sender_id is None:
+            return FIND_USAGE
+        numbers, total = self.search_index.search(query, resolved, sender_id, limit)
+        if not numbers:
+            return "Ничего не найдено."
+
+        lines = [f"Найдено задач: {total}" +
+                 (f", последние {len(numbers)}:" if total > len(numbers) else ":")]
+        for task_number in numbers:
+            _, is_resolved, client_name = self.search_index.docs[task_number]
+            line = f"{'🟢' if is_resolved else '🔴'} #{task_number} {client_name}"
+            thread_id = self.threads.get(task_number)
+            if thread_id:
+                line += f" — {topic_link(thread_id)}"
+            lines.append(line)
+        return "\n".join(lines)
+
+    def stats_report(self, text=""):
+        """
+        Текст ответа на /stats: сводка за последние N дней из дневных счётчиков
+        хранилища — без прохода по задачам, сколько бы их ни было.
+        """
+        text = text.strip()
+        if text and not text.isdigit():
+            return STATS_USAGE
+        days = min(max(int(text or STATS_DEFAULT_DAYS), 1), STATS_MAX_DAYS)
+        today = datetime.now().date()
+        totals = {}
+        names = {}
+        for offset in range(days):
+            for metric, value in self.store.stats.day((today - timedelta(days=offset)).isoformat()).items():
+                kind, _, rest = metric.partition('|')
+                if kind == 'name':
+                    # Дни идут от сегодняшнего: остаётся самое свежее имя
+                    user_id, _, name = rest.partition('|')
+                    names.setdefault(int(user_id), name)
+                else:
+                    totals[metric] = totals.get(metric, 0) + value
+
+        lines = [
+            f"📊 Статистика за {days} дн.",
+            f"Создано задач: {int(totals.get('created', 0))}",
+            f"Решено: {int(totals.get('resolved', 0))}, возвращено в работу: {int(totals.get('reopened', 0))}",
+            f"Открыто сейчас: {int(self.store.stats.get('', 'open'))}",
+        ]
+        if totals.get('resolve_count'):
+            lines.append(f"Среднее время решения: "
+                         f"{format_duration(totals['resolve_seconds'] / totals['resolve_count'])}")
+
+        receivers = {}
+        for metric, value in totals.items():
+            kind, _, rest = metric.partition('|')
+            if kind not in ('status', 'replies', 'reply_seconds'):
+                continue
+            user_id, _, status = rest.partition('|')
+            counters = receivers.setdefault(int(user_id), {})
+            key = status if kind == 'status' else kind
+            counters[key] = counters.get(key, 0) + value
+        if receivers:
+            lines.append("")
+            lines.append("Получатели (ответов, среднее время ответа, беру / не могу / уточнения):")
+        for user_id, counters in sorted(receivers.items(), key=lambda item: -item[1].get('replies', 0)):
+            profile = user_profiles.get(user_id)
+            name = format_user_name(profile) if profile else names.get(user_id, f"id {user_id}")
+            replies = int(counters.get('replies', 0))
+            average = format_duration(counters['reply_seconds'] / replies) if replies else "—"
+            lines.append(f"{name}: {replies}, {average}, "
+                         + " / ".join(str(int(counters.get(STATUS_MAP[action], 0)))
+                                      for action in ('take', 'cant_take', 'no_competence')))
+        return "\n".join(lines)
+
+    def create_task(self, chat_id):
+        return self.drafts.start(chat_id, {field: None for field in TASK_FIELD_NAMES})
+
+    def set_draft_field(self, chat_id, field, value):
+        """Заполняет поле черновика и ставит курсор на следующее; None, если черновик истёк."""
+        return self.drafts.set_field(chat_id, field, value, TASK_FIELD_STEPS[field] + 1)
+
+    @staticmethod
+    def get_next_field(draft):
+        """Поле, которое ждёт черновик, или None, если все шаги пройдены."""
+        return TASK_FIELD_NAMES[draft.step] if draft.step < len(TASK_FIELD_NAMES) else None
+
+    def fill_draft(self, chat_id, message):
+        """
+        Записывает сообщение отправителя в ожидаемое поле. Возвращает
+        (следующее поле, None), пока черновик не заполнен, и (None, поля задачи),
+        когда заполнен: черновик тогда уже удалён, и задачу публикуют без
+        блокировки черновика. None — черновика нет или он уже заполнен.
+        """
+        with self.draft_lock(chat_id):
+            draft = self.drafts.get(chat_id)
+            if draft is None:
+                return None
+            current_field = self.get_next_field(draft)
+            if not current_field:
+                return None
+            draft = self.set_draft_field(chat_id, current_field, handle_media_message(message, draft.fields))
+            next_field = self.get_next_field(draft)
+            if next_field:
+                return next_field, None
+            # Повторное нажатие или сообщение заполненный черновик уже не найдёт
+            self.drafts.drop(chat_id)
+            return None, draft.fields
+
+    def skip_photo(self, chat_id):
+        """
+        Кнопка «Пропустить шаг»: фото — последний шаг, поэтому возвращает поля
+        готовой задачи без фото (черновик удалён) или None, если черновика нет.
+        """
+        with self.draft_lock(chat_id):
+            draft = self.drafts.drop(chat_id)
+        if draft is None:
+            return None
+        return dict(draft.fields, photo=None)
+
+    def expire_drafts(self):
+        """Удаляет черновики без ответа дольше DRAFT_TTL_MINUTES и сообщает об этом отправителям."""
+        expired = []
+        for chat_id in self.drafts.expired():
+            with self.draft_lock(chat_id):
+                if self.drafts.drop_if_expired(chat_id):
+                    expired.append(chat_id)
+        for chat_id in expired:
+            self.outbox.put('send_message', priority=PRIORITY_BACKGROUND, chat_id=chat_id, text=draft_expired_text())
+        if expired:
+            logger.info(f"Expired {len(expired)} task drafts")
+        return expired
+
+    def register_task(self, chat_id, draft, sender_name):
+        """Записывает готовый черновик как новую задачу; возвращает (task_number, task_data)."""
+        now = datetime.now()
+        task_data = dict(draft, **{
+            'sender_name': sender_name,
+            'status': {},
+            'responded_users': [],
+            'is_resolved': False,
+            'sender_id': chat_id,
+            'created_at': now.isoformat(),
+            # Получатели выбираются один раз: рассылка, напоминания и уведомления идут только им
+            'receivers': list(self.router.route(draft))
+        })
+        # Номер выделяется и занимается одной атомарной операцией
+        with self._counter_lock:
+            task_number = self.task_counter
+            self._record('task_created', task_number=task_number, task=task_data)
+        tasks_created.inc()
+        self.search_index.add(task_number, task_data)
+        return task_number, self.get_task_snapshot(task_number)
+
+    def main_chat_post(self, task_number, task_data):
+        """Сообщение о новой задаче в основном чате: (имя_метода, kwargs)."""
+        return self._task_post(task_number, task_data, INFO_CHAT_ID)
+
+    def set_main_chat_message(self, task_number, message_id):
+        self._record('task_updated', task_number=task_number, fields={'main_chat_message_id': message_id})
+
+    def forum_post(self, task_number, task_data, thread_id):
+        """Сообщение с кнопками в новой теме форума: (имя_метода, kwargs)."""
+        return self._task_post(task_number, task_data, INFO_CHAT_ID, message_thread_id=thread_id,
+                               reply_markup=self.generate_task_controls(task_number, False))
+
+    def publish(self, task_number, task_data, thread_id, message_id):
+        """Тема и сообщение в форуме созданы: рассылка получателям и сроки напоминаний."""
+        self._record('task_published', task_number=task_number, thread_id=thread_id, message_id=message_id)
+        self.deliver_to_receivers(task_number, task_data)
+        self.start_timers(task_number)
+
+    def deliver_to_receivers(self, task_number, task_data):
+        """Ставит рассылку задачи получателям в outbox; воркеры отправляют её параллельно."""
+        receivers = task_receivers(task_data)
+        for receiver_id in receivers:
+            method_name, kwargs = self._task_post(task_number, task_data, receiver_id,
+                                                  reply_markup=self.main_task_keyboard(task_number))
+            self.outbox.put(method_name, key=f"deliver:{task_number}:{receiver_id}", **kwargs)
+        logger.info(f"Task #{task_number} queued for {len(receivers)} receivers")
+
+    def _task_post(self, task_number, task_data, chat_id, **kwargs):
+        text = self.generate_task_message(task_number, task_data, with_status=False)
+        if task_data.get('photo'):
+            return 'send_photo', dict(chat_id=chat_id, photo=task_data['photo'], caption=text,
+                                      parse_mode="Markdown", **kwargs)
+        return 'send_message', dict(chat_id=chat_id, text=text, parse_mode="Markdown", **kwargs)
+
+    def start_timers(self, task_number):
+        """
+        Назначает сроки напоминания и уведомления о неответивших. Вызывается
+        после того, как рассылка получателям поставлена в очередь: задача,
+        которую не удалось опубликовать, напоминаний не получает.
+        """
+        now = datetime.now()
+        # Сроки хранятся в самой задаче и переживают перезапуск
+        self._record('task_updated', task_number=task_number, fields={
+            'reminder_at': (now + timedelta(minutes=REMINDER_DELAY_MINUTES)).isoformat(),
+            'notify_at': (now + timedelta(minutes=UNANSWERED_NOTIFY_DELAY_MINUTES)).isoformat()
+        })
+        self.schedule_timer(task_number)
+
+    def schedule_timer(self, task_number):
+        """Ставит единственный таймер задачи на ближайший ещё не отработавший срок."""
+        if REMINDER_MODE == 'digest':
+            return  # сроки забирает периодический дайджест (collect_due_timers)
+        task_data = self.get_task_snapshot(task_number)
+        if not task_data:
+            return
+        pending = [task_data[field] for field in TIMER_FIELDS if task_data.get(field)]
+        if not pending:
+            return
+        self._arm_timer(task_number, max(datetime.fromisoformat(min(pending)), datetime.now()))
+
+    @abstractmethod
+    def _arm_timer(self, task_number, run_date):
+        """Ставит (или переставляет) таймер задачи на run_date в планировщике движка."""
+
+    def due_timers(self, task_number):
+        """Наступившие сроки одной задачи в том же виде, что и у collect_due_timers."""
+        task_data = self.get_task_snapshot(task_number)
+        now = datetime.now().isoformat()
+        return {field: [task_number] if task_data and task_data.get(field) and task_data[field] <= now else []
+                for field in TIMER_FIELDS}
+
+    def collect_due_timers(self):
+        """Наступившие сроки всех задач: {'reminder_at': [номера], 'notify_at': [номера]}."""
+        now = datetime.now().isoformat()
+        due = {field: [] for field in TIMER_FIELDS}
+        for task_number, task_data in self.tasks.scan():
+            for field in TIMER_FIELDS:
+                deadline = task_data.get(field)
+                if deadline and deadline <= now:
+                    due[field].append(task_number)
+        return due
+
+    def complete_timer(self, task_number, field):
+        self._record('task_updated', task_number=task_number, fields={field: None})
+        timers_fired.inc(timer=field)
+
+    def unanswered_by_task(self, task_numbers):
+        """(номер задачи, [id неответивших получателей]) — движок превращает id в имена."""
+        unanswered = []
+        for task_number in task_numbers:
+            task_data = self.get_task_snapshot(task_number)
+            if task_data:
+                unanswered.append((task_number, unanswered_receivers(task_data)))
+        return unanswered
+
+    def send_due(self, due, notices):
+        """
+        Отрабатывает наступившие сроки (due — как у collect_due_timers): одно
+        напоминание каждому неответившему получателю по всем его задачам и
+        уведомления notices [(номер, [имена неответивших])] в группу.
+        Один таймер задачи и периодический дайджест идут через этот же метод.
+        """
+        reminders = {}
+        for task_number in due['reminder_at']:
+            task_data = self.get_task_snapshot(task_number)
+            if task_data:
+                for user_id in unanswered_receivers(task_data):
+                    reminders.setdefault(user_id, []).append(task_number)
+        for user_id, task_numbers in reminders.items():
+            key = f"reminder:{user_id}:{','.join(map(str, task_numbers))}"
+            try:
+                for part, text in enumerate(reminder_texts(task_numbers)):
+                    self.outbox.put('send_message', key=f"{key}:{part}", priority=PRIORITY_BACKGROUND,
+                                    chat_id=user_id, text=text)
+            except Exception as e:
+                logger.error(f"Error queueing reminder to user {user_id}: {e}")
+        for task_number in due['reminder_at']:
+            self.complete_timer(task_number, 'reminder_at')
+
+        notices = [(task_number, names) for task_number, names in notices if names]
+        # При ошибке сроки notify_at остаются и попадут в следующий проход
+        for message in unanswered_notice_texts(notices) if notices else ():
+            self.outbox.put('send_message', priority=PRIORITY_BACKGROUND, chat_id=INFO_CHAT_ID, text=message)
+        for task_number in due['notify_at']:
+            self.complete_timer(task_number, 'notify_at')
+
+        if reminders or notices:
+            logger.info(f"Reminders queued for {len(reminders)} receivers, "
+                        f"{len(notices)} unanswered tasks reported")
+
+    def rearm_timers(self):
+        if REMINDER_MODE == 'digest':
+            logger.info("Digest mode: task deadlines are collected by the digest job.")
+            return
+        armed = 0
+        for task_number, task_data in self.tasks.scan():
+            if any(task_data.get(field) for field in TIMER_FIELDS):
+                self.schedule_timer(task_number)
+                armed += 1
+        logger.info(f"Re-armed {armed} task timers.")
+
+    def forum_action(self, task_number, action, user):
+        """
+        Кнопка в теме форума: меняет состояние задачи и возвращает (ответ на
+        нажатие, вызовы API для темы). Вызовы [(имя_метода, kwargs)] движок
+        выполняет по порядку и затем вызывает forum_action_done; None вместо
+        списка — состояние не менялось, нужно только ответить.
+        """
+        task_data = self.tasks.get(task_number)
+        if not task_data and action == 'reopen':
+            # Старые решённые задачи лежат в архиве — поднимаем по кнопке «Вернуть в работу»
+            task_data = self.restore_archived_task(task_number)
+        if not task_data:
+            return "Задача не найдена!", None
+
+        thread_id = self.threads.get(task_number)
+        if not thread_id:
+            return "Ошибка топика!", None
+
+        topic = dict(chat_id=INFO_CHAT_ID, message_thread_id=thread_id)
+        if action == 'resolve':
+            if not self.try_set_resolved(task_number, True):
+                return "Задача уже решена!", None
+            calls = [('close_forum_topic', topic),
+                     ('edit_forum_topic', dict(topic, name=self.topic_name(task_number, task_data, "🟢")))]
+        elif action == 'reopen':
+            if not self.try_set_resolved(task_number, False):
+                return "Задача уже открыта!", None
+            calls = [('reopen_forum_topic', topic),
+                     ('edit_forum_topic', dict(topic, name=self.topic_name(task_number, task_data, "🔴")))]
+        elif action == 'take':
+            self.set_status(task_number, user_full_name(user), STATUS_MAP['take'],
+                            user_id=user.id, responded=False)
+            calls = [('edit_forum_topic', dict(topic, name=self.topic_name(task_number, task_data, "🟡")))]
+        else:
+            calls = []
+        return "Статус обновлен!", calls
+
+    def forum_action_done(self, task_number, action):
+        """Вызовы API по кнопке форума выполнены: тема соответствует задаче."""
+        if action in ('resolve', 'reopen'):
+            self.set_topic_resolved(task_number, action == 'resolve')
+        self.update_forum_message(task_number)
+
+    def record_response(self, task_number, action, user):
+        """Ответ получателя кнопкой в личном чате; возвращает текст статуса или None."""
+        status = STATUS_MAP.get(action)
+        if status:
+            self.set_status(task_number, user_full_name(user), status, user_id=user.id)
+            self.update_main_chat_status(task_number)
+        return status
+
+    def update_forum_message(self, task_number):
+        message_id = self.message_ids.get(task_number)
+        if message_id is None:
+            logger.error(f"Error updating forum message: no message for task #{task_number}")
+            return
+        self.edit_coalescer.submit(
+            INFO_CHAT_ID, message_id,
+            lambda: self._render_edit(
+                task_number, INFO_CHAT_ID, message_id,
+                markup=lambda task_data: self.generate_task_controls(task_number, task_data['is_resolved']))
+        )
+
+    def update_main_chat_status(self, task_number):
+        message_id = self.tasks[task_number].get('main_chat_message_id')
+        if message_id is not None:
+            self.edit_coalescer.submit(
+                INFO_CHAT_ID, message_id,
+                lambda: self._render_edit(task_number, INFO_CHAT_ID, message_id)
+            )
+
+    def _render_edit(self, task_number, chat_id, message_id, markup=None):
+        """Правка сообщения задачи; markup(task_data) строит клавиатуру по тому же снимку."""
+        # Снимок и версия для кэша отрисовки должны быть согласованы
+        with self.task_lock(task_number):
+            task_data = self.tasks[task_number]
+            body = self.generate_task_message(task_number, task_data, with_status=True)
+            kwargs = dict(chat_id=chat_id, message_id=message_id, parse_mode="Markdown")
+            if markup is not None:
+                kwargs['reply_markup'] = markup(task_data)
+            if task_data.get('photo'):
+                return 'edit_message_caption', dict(kwargs, caption=body)
+            return 'edit_message_text', dict(kwargs, text=body)
+
+    def generate_task_message(self, task_number, task_data, with_status=True):
+        with self.task_lock(task_number):
+            key = (task_number, self._versions.get(task_number, 0), with_status)
+            return self._render_cache.get_or_create(
+                key, lambda: self._render_task_message(task_number, task_data, with_status))
+
+    @staticmethod
+    def _render_task_message(task_number, task_data, with_status):
+        message = [
+            f"*Задача #{task_number}*",
+            f"👤 Отправитель: {task_data['sender_name']}",
+            f"📌 Клиент: {task_data['client_name']}",
+            f"⚠️ Срочность: {task_data['urgency']}",
+            f"📝 Задача: {task_data['what_to_do']}",
+            f"🎯 Цель: {task_data['goal']}",
+            f"📄 ПП клиента: {task_data['client_pp']}",
+            f"⚙️ Оборудование: {task_data['equipment']}",
+            f"💰 Сумма/часы: {task_data['cost_and_hours']}",
+            f"📞 Контакты: {task_data['contact_person']}",
+        ]
+
+        if with_status and task_data.status:
+            message.append("\n*Статусы ответов:*")
+            message.extend(
+                f"• {user_name} — {status}"
+                for user_name, status in task_data.status.values()
+            )
+
+        return "\n".join(message)
+
+    def main_task_keyboard(self, task_number):
+        return self._keyboard_cache.get_or_create(('user', task_number), lambda: self.create_keyboard([
+            [("Беру задачу", f"user_take:{task_number}")],
+            [("Не уверен, нужны уточнения",
+              f"user_no_competence:{task_number}")],
+            [("Не могу взять", f"user_cant_take:{task_number}")]
+        ]))
+
+    def generate_task_controls(self, task_number, is_resolved):
+        # Клавиатуры для обоих состояний строятся один раз и переиспользуются
+        return self._keyboard_cache.get_or_create(
+            ('forum', task_number, is_resolved),
+            lambda: self._build_task_controls(task_number, is_resolved)
+        )
+
+    def _build_task_controls(self, task_number, is_resolved):
+        if is_resolved:
+            return self.create_keyboard([[("🔴 Вернуть в работу", f"forum_reopen:{task_number}")]])
+        return self.create_keyboard([
+            [("🟢 Решено", f"forum_resolve:{task_number}")],
+            [("🟡 Взять в работу", f"forum_take:{task_number}")]
+        ])
+
+    @staticmethod
+    def create_keyboard(buttons, row_width=1):
+        keyboard = types.InlineKeyboardMarkup(row_width=row_width)
+        for btn in buttons:
+            if isinstance(btn, list):
+                keyboard.add(
+                    *[types.InlineKeyboardButton(text, callback_data=data) for text, data in btn])
+            else:
+                keyboard.add(types.InlineKeyboardButton(
+                    btn[0], callback_data=btn[1]))
+        return keyboard
+
+    @staticmethod
+    def topic_name(task_number, task_data, marker):
+        return f"{marker} {task_number} {task_data['client_name'][:MAX_TOPIC_LENGTH]}"
+
+
+user_profiles = TTLCache(USER_PROFILE_CACHE_SIZE, USER_PROFILE_TTL)
+
+
+def remember_user(user):
+    """Имена отправителей и получателей берутся из входящих обновлений без запросов к API."""
+    user_profiles.set(user.id, {
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'username': user.username
+    })
+
+
+def format_user_name(profile, with_username=False):
+    user_name = profile['first_name']
+    if profile['last_name']:
+        user_name += f" {profile['last_name']}"
+    if with_username and profile['username']:
+        user_name += f" (@{profile['username']})"
+    return user_name
+
+
+def user_full_name(user):
+    """Имя и фамилия автора обновления (telebot User)."""
+    return f"{user.first_name} {user.last_name}" if user.last_name else user.first_name
+
+
+def task_receivers(task_data):
+    """Получатели задачи; у задач, созданных до маршрутизации, — все."""
+    return task_data.receivers or RECEIVER_USER_IDS
+
+
+def unanswered_receivers(task_data):
+    return [user_id for user_id in task_receivers(task_data) if user_id not in task_data.responded]
+
+
+def format_duration(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} мин"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours} ч {minutes} мин"
+    days, hours = divmod(hours, 24)
+    return f"{days} д {hours} ч"
+
+
+def draft_expired_text():
+    return (f"⌛ Черновик задачи удалён: не было ответа {DRAFT_TTL_MINUTES} мин. "
+            f"Нажмите «Создать задачу», чтобы начать заново.")
+
+
+def topic_link(thread_id):
+    # Ссылка на тему форума: id супергруппы без префикса -100
+    return f"https://t.me/c/{str(INFO_CHAT_ID).removeprefix('-100')}/{thread_id}"
+
+
+def reminder_texts(task_numbers):
+    """
+    Напоминание получателю по его задачам. Одна задача — прежний текст;
+    несколько — список, разбитый по лимиту длины сообщения.
+    """
+    if len(task_numbers) == 1:
+        return [f"⏰ Напоминание! Пожалуйста, ответьте на задачу #{task_numbers[0]}."]
+
+    header = "⏰ Напоминание! Пожалуйста, ответьте на задачи: "
+    texts, current = [], []
+    length = len(header) + 1  # с точкой в конце
+    for task_number in task_numbers:
+        item = f"#{task_number}"
+        if current and length + len(", ") + len(item) > MAX_MESSAGE_LENGTH:
+            texts.append(header + ", ".join(current) + ".")
+            current, length = [], len(header) + 1
+        length += len(item) + (len(", ") if current else 0)
+        current.append(item)
+    texts.append(header + ", ".join(current) + ".")
+    return texts
+
+
+def unanswered_notice_texts(entries):
+    """
+    Уведомления для INFO_CHAT_ID по списку (номер задачи, [имена]). Одна задача —
+    прежний текст; несколько — сводка, разбитая по лимиту длины сообщения.
+    """
+    if len(entries) == 1:
+        task_number, names = entries[0]
+        return [
+            f"@aagutenev\n"
+            f"Следующие специалисты не дали ответ на задачу #{task_number} в течение часа:\n"
+            f"{', '.join(names)}"
+        ]
+
+    header = "@aagutenev\nСледующие специалисты не дали ответ на задачи в течение часа:"
+    texts, current = [], header
+    for task_number, names in entries:
+        line = f"\n#{task_number}: {', '.join(names)}"
+        if len(current) + len(line) > MAX_MESSAGE_LENGTH:
+            texts.append(current)
+            current = header
+        current += line
+    texts.append(current)
+    return texts
+
+
+def skip_step_keyboard():
+    return TaskState.create_keyboard([("Пропустить шаг", "skip_step")])
+
+
+def field_prompt(field):
+    """Вопрос мастера о поле черновика: (текст, клавиатура или None)."""
+    return f"Теперь отправьте {TASK_FIELD_PROMPTS[field]}.", skip_step_keyboard() if field == 'photo' else None
+
+
+def handle_media_message(message, task_data):
+    if message.content_type == 'photo':
+        return message.photo[-1].file_id
+    return message.text if message.content_type == 'text' else None
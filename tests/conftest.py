@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class RecordingOutbox:
+    """Outbox, который только запоминает поставленные вызовы."""
+
+    def __init__(self):
+        self.queued = []
+
+    def put(self, method, key=None, priority=None, **kwargs):
+        self.queued.append((method, kwargs))
+
+
+@pytest.fixture
+def task_state(tmp_path, monkeypatch):
+    """TaskState с файлами состояния во временном каталоге; таймеры и outbox только запоминают вызовы."""
+    from tasks import TaskState
+
+    class RecordingTaskState(TaskState):
+        def __init__(self):
+            self.armed = {}
+            super().__init__(RecordingOutbox())
+
+        def _arm_timer(self, task_number, run_date):
+            self.armed[task_number] = run_date
+
+    monkeypatch.chdir(tmp_path)
+    state = RecordingTaskState()
+    yield state
+    state.store.close()
+
+
+@pytest.fixture
+def add_task(task_state):
+    """add_task(sender_id, **поля) — регистрирует задачу из черновика и возвращает её номер."""
+    from tasks import TASK_FIELD_NAMES
+
+    def add(sender_id, **fields):
+        draft = dict({field: "—" for field in TASK_FIELD_NAMES}, photo=None, **fields)
+        task_number, _ = task_state.register_task(sender_id, draft, "Отправитель")
+        return task_number
+    return add
@@ -0,0 +1,33 @@
+from types import SimpleNamespace
+
+from tasks import TASK_FIELD_NAMES
+
+
+def text_message(text):
+    return SimpleNamespace(content_type='text', text=text)
+
+
+def test_completed_draft_is_taken_before_publishing(task_state):
+    task_state.create_task(1)
+    steps = [task_state.fill_draft(1, text_message(field)) for field in TASK_FIELD_NAMES[:-1]]
+    assert steps[-1] == ('photo', None)
+
+    assert task_state.skip_photo(1) == dict({field: field for field in TASK_FIELD_NAMES[:-1]}, photo=None)
+    assert 1 not in task_state.drafts
+    # Повторное нажатие, пока задача публикуется, второй задачи не создаст
+    assert task_state.skip_photo(1) is None
+    assert task_state.fill_draft(1, text_message("ещё")) is None
+
+
+def test_register_task_keeps_the_next_draft(task_state):
+    task_state.create_task(1)
+    for field in TASK_FIELD_NAMES[:-1]:
+        task_state.fill_draft(1, text_message(field))
+    next_field, task_data = task_state.fill_draft(1, SimpleNamespace(content_type='photo',
+                                                                     photo=[SimpleNamespace(file_id="f")]))
+    assert next_field is None and task_data['photo'] == "f"
+
+    # Отправитель начал новую задачу, пока прежняя публиковалась
+    task_state.create_task(1)
+    task_state.register_task(1, task_data, "Отправитель")
+    assert 1 in task_state.drafts
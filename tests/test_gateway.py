@@ -0,0 +1,192 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from telebot.apihelper import ApiTelegramException
+
+import gateway
+from gateway import (TelegramGateway, TokenBucket, EditCoalescer, AsyncEditCoalescer,
+                     PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE)
+
+
+class FakeClock:
+    """Подменяет модуль time в gateway: sleep сдвигает часы, а не ждёт."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    perf_counter = monotonic
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeBot:
+    """Методы Bot API, которые запоминают (время, метод, чат); errors — исключения для первых вызовов."""
+
+    def __init__(self, clock=None, errors=()):
+        self.clock = clock or time
+        self.calls = []
+        self.errors = list(errors)
+
+    def __getattr__(self, method_name):
+        def method(chat_id=None, *args, **kwargs):
+            self.calls.append((self.clock.monotonic(), method_name, chat_id))
+            if self.errors:
+                raise self.errors.pop(0)
+            return method_name
+        return method
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(gateway, 'time', clock)
+    return clock
+
+
+def flood_error(retry_after):
+    return ApiTelegramException('sendMessage', None, {
+        'error_code': 429, 'description': f"Too Many Requests: retry after {retry_after}",
+        'parameters': {'retry_after': retry_after}})
+
+
+def test_token_bucket_reserves_into_debt():
+    bucket = TokenBucket(rate=2, capacity=2)
+    now = bucket.updated
+    assert [bucket.reserve(now) for _ in range(4)] == [0, 0, 0.5, 1.0]
+    assert bucket.delay(now + 1) == 0.5
+    bucket.block(10, now + 1)
+    assert bucket.delay(now + 1) == pytest.approx(10)
+
+
+def test_private_and_group_chats_have_separate_buckets(clock):
+    bot = FakeBot(clock)
+    api = TelegramGateway(bot, global_rate=1000, private_chat_rate=1, group_rate_per_minute=20)
+    for _ in range(3):
+        api.send_message(100, "лично")
+    api.send_message(200, "другому")
+    for _ in range(21):
+        api.send_message(-100, "в группу")
+
+    times = {}
+    for at, _, chat_id in bot.calls:
+        times.setdefault(chat_id, []).append(at - 1000)
+    assert times[100] == [0, 1, 2]
+    assert times[200] == [2]
+    # 20 сообщений в минуту: ведро на 20 штук, следующее — через 3 секунды
+    assert times[-100][:20] == [2] * 20
+    assert times[-100][20] == pytest.approx(5)
+
+
+def test_flood_limit_waits_retry_after_and_retries(clock):
+    bot = FakeBot(clock, errors=[flood_error(7)])
+    api = TelegramGateway(bot, global_rate=1000, group_rate_per_minute=20)
+
+    assert api.send_message(-100, "текст") == 'send_message'
+    assert [at - 1000 for at, _, _ in bot.calls] == [0, pytest.approx(7)]
+
+
+def test_flood_limit_gives_up_after_max_retries(clock):
+    bot = FakeBot(clock, errors=[flood_error(1) for _ in range(3)])
+    api = TelegramGateway(bot, global_rate=1000, max_retries=2)
+
+    with pytest.raises(ApiTelegramException):
+        api.send_message(-100, "текст")
+    assert len(bot.calls) == 3
+
+
+def test_interactive_calls_overtake_background_ones():
+    bot = FakeBot()
+    api = TelegramGateway(bot, global_rate=10)
+    for _ in range(10):
+        api.get_me()  # глобальное ведро пустое, следующий токен через 0.1 с
+
+    background = threading.Thread(target=api.call, args=('get_updates',), kwargs={'priority': PRIORITY_BACKGROUND})
+    background.start()
+    time.sleep(0.03)
+    interactive = threading.Thread(target=api.call, args=('answer_callback_query',),
+                                   kwargs={'priority': PRIORITY_INTERACTIVE})
+    interactive.start()
+    background.join()
+    interactive.join()
+
+    assert [method for _, method, _ in bot.calls[10:]] == ['answer_callback_query', 'get_updates']
+
+
+class RecordingApi:
+    """api для EditCoalescer: call записывает правку; block задерживает отправку до release."""
+
+    def __init__(self):
+        self.calls = []
+        self.block = None
+        self.sending = threading.Event()
+
+    def call(self, method_name, **kwargs):
+        self.sending.set()
+        if self.block is not None:
+            self.block.wait(5)
+        self.calls.append((method_name, kwargs))
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def text_edit(text):
+    return lambda: ('edit_message_text', {'chat_id': -100, 'message_id': 1, 'text': text})
+
+
+def test_edits_within_window_collapse_into_the_last_one():
+    api = RecordingApi()
+    coalescer = EditCoalescer(api, window=0.05)
+    for n in range(5):
+        coalescer.submit(-100, 1, text_edit(f"статус {n}"))
+    coalescer.submit(-100, 2, lambda: ('edit_message_text', {'chat_id': -100, 'message_id': 2, 'text': "другое"}))
+
+    wait_until(lambda: len(api.calls) == 2)
+    time.sleep(0.1)
+    coalescer.stop()
+    assert sorted(kwargs['text'] for _, kwargs in api.calls) == ["другое", "статус 4"]
+
+
+def test_edit_arriving_during_send_is_sent_afterwards():
+    api = RecordingApi()
+    api.block = threading.Event()
+    coalescer = EditCoalescer(api, window=0.02)
+    coalescer.submit(-100, 1, text_edit("первая"))
+    assert api.sending.wait(5)
+    coalescer.submit(-100, 1, text_edit("вторая"))
+    api.block.set()
+
+    wait_until(lambda: len(api.calls) == 2)
+    # Та же правка ещё раз не отправляется
+    coalescer.submit(-100, 1, text_edit("вторая"))
+    time.sleep(0.1)
+    coalescer.stop()
+    assert [kwargs['text'] for _, kwargs in api.calls] == ["первая", "вторая"]
+
+
+def test_async_coalescer_sends_last_edit_once():
+    class AsyncRecordingApi(RecordingApi):
+        async def call(self, method_name, **kwargs):
+            super().call(method_name, **kwargs)
+
+    async def run():
+        api = AsyncRecordingApi()
+        coalescer = AsyncEditCoalescer(api, window=0.02)
+        for n in range(5):
+            coalescer.submit(-100, 1, text_edit(f"статус {n}"))
+        await asyncio.sleep(0.1)
+        return api.calls
+
+    assert [kwargs['text'] for _, kwargs in asyncio.run(run())] == ["статус 4"]
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from outbox import Outbox, AsyncOutbox
+
+
+class ApiError(Exception):
+    """Ошибка Bot API с кодом, как ApiTelegramException."""
+
+    def __init__(self, error_code, description=""):
+        super().__init__(f"{error_code} {description}")
+        self.error_code = error_code
+        self.description = description
+
+
+class FakeApi:
+    """Записывает вызовы; fail(method, kwargs) может вернуть исключение для этого вызова."""
+
+    def __init__(self, fail=None):
+        self.calls = []
+        self.times = []
+        self.fail = fail or (lambda method_name, kwargs: None)
+
+    def call(self, method_name, priority=None, **kwargs):
+        self.calls.append((method_name, kwargs))
+        self.times.append(time.monotonic())
+        error = self.fail(method_name, kwargs)
+        if error is not None:
+            raise error
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def make_outbox(tmp_path):
+    """make_outbox(api, **kwargs) — Outbox на task_outbox.db в tmp_path; останавливается после теста."""
+    outboxes = []
+
+    def make(api, **kwargs):
+        outbox = Outbox(api, path=str(tmp_path / 'task_outbox.db'), **dict({'workers': 1}, **kwargs))
+        outboxes.append(outbox)
+        return outbox
+    yield make
+    for outbox in outboxes:
+        if not outbox._stopped:
+            outbox.stop()
+
+
+def test_retries_with_exponential_backoff_then_drops(make_outbox):
+    api = FakeApi(fail=lambda method_name, kwargs: ConnectionError("network down"))
+    outbox = make_outbox(api, max_attempts=4, retry_base=0.02).start()
+    outbox.put('send_message', chat_id=1, text="привет")
+
+    wait_until(lambda: outbox.depth() == 0)
+    assert len(api.calls) == 4
+    gaps = [later - earlier for earlier, later in zip(api.times, api.times[1:])]
+    # Задержка base * 2**попытка со случайным множителем от 0.5 до 1
+    for attempt, gap in enumerate(gaps):
+        assert gap >= 0.02 * 2 ** attempt * 0.5
+
+
+@pytest.mark.parametrize('error_code', [400, 403, 404])
+def test_permanent_errors_are_not_retried(make_outbox, error_code):
+    api = FakeApi(fail=lambda method_name, kwargs: ApiError(error_code, "Forbidden: bot was blocked by the user"))
+    outbox = make_outbox(api, retry_base=0.01).start()
+    outbox.put('send_message', chat_id=1, text="привет")
+
+    wait_until(lambda: outbox.depth() == 0)
+    time.sleep(0.05)
+    assert len(api.calls) == 1
+
+
+def test_same_key_replaces_pending_call(make_outbox):
+    api = FakeApi()
+    outbox = make_outbox(api)
+    outbox.put('edit_message_text', key="edit:1:10", chat_id=1, message_id=10, text="первая")
+    outbox.put('edit_message_text', key="edit:1:10", chat_id=1, message_id=10, text="вторая")
+    outbox.put('send_message', chat_id=1, text="без ключа")
+    outbox.put('send_message', chat_id=1, text="без ключа")
+    assert outbox.depth() == 3
+
+    outbox.start()
+    wait_until(lambda: outbox.depth() == 0)
+    assert sorted(kwargs['text'] for _, kwargs in api.calls) == ["без ключа", "без ключа", "вторая"]
+
+
+@pytest.mark.parametrize('first_fails', [False, True])
+def test_newer_call_survives_finish_of_inflight_one(make_outbox, first_fails):
+    sending = threading.Event()
+    release = threading.Event()
+
+    def fail(method_name, kwargs):
+        if kwargs['text'] == "первая":
+            sending.set()
+            release.wait(5)
+            return ConnectionError("timeout") if first_fails else None
+        return None
+    api = FakeApi(fail=fail)
+    outbox = make_outbox(api, retry_base=60).start()
+    outbox.put('edit_message_text', key="edit:1:10", chat_id=1, message_id=10, text="первая")
+    assert sending.wait(5)
+
+    # Замена приходит, пока первая правка отправляется
+    outbox.put('edit_message_text', key="edit:1:10", chat_id=1, message_id=10, text="вторая")
+    release.set()
+
+    wait_until(lambda: outbox.depth() == 0)
+    assert [kwargs['text'] for _, kwargs in api.calls] == ["первая", "вторая"]
+
+
+def test_pending_calls_are_delivered_after_restart(make_outbox):
+    failing = FakeApi(fail=lambda method_name, kwargs: ConnectionError("network down"))
+    outbox = make_outbox(failing, retry_base=0.2).start()
+    outbox.put('send_message', key="deliver:1:100", chat_id=100, text="задача")
+    wait_until(lambda: failing.calls)
+    outbox.stop()
+
+    api = FakeApi()
+    outbox = make_outbox(api, retry_base=0.2)
+    assert outbox.depth() == 1
+    outbox.start()
+    wait_until(lambda: outbox.depth() == 0)
+    assert api.calls == [('send_message', {'chat_id': 100, 'text': "задача"})]
+
+
+def test_async_outbox_delivers_calls_left_from_previous_run(tmp_path):
+    path = str(tmp_path / 'task_outbox.db')
+    outbox = Outbox(FakeApi(), path=path)
+    outbox.put('send_message', chat_id=1, text="из прошлого запуска")
+    outbox.close()
+
+    class AsyncFakeApi(FakeApi):
+        async def call(self, method_name, priority=None, **kwargs):
+            super().call(method_name, priority=priority, **kwargs)
+
+    async def run():
+        api = AsyncFakeApi()
+        outbox = AsyncOutbox(api, path=path, workers=1).start()
+        outbox.put('send_message', chat_id=1, text="новый")
+        for _ in range(500):
+            if outbox.depth() == 0:
+                break
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+        return api.calls
+
+    assert sorted(kwargs['text'] for _, kwargs in asyncio.run(run())) == ["из прошлого запуска", "новый"]
@@ -0,0 +1,45 @@
+def test_reconcile_skips_tasks_archived_meanwhile(task_state, add_task):
+    numbers = [add_task(1, client_name=f"Клиент {n}") for n in range(3)]
+    for task_number in numbers:
+        task_state.start_timers(task_number)
+    task_state.armed.clear()
+
+    def arm_and_archive(task_number, run_date):
+        # Архивирование в другом потоке убирает задачу посреди прохода сверки
+        if numbers[-1] in task_state.tasks:
+            task_state._record('task_archived', task_number=numbers[-1])
+        task_state.armed[task_number] = run_date
+    task_state._arm_timer = arm_and_archive
+
+    assert task_state.reconcile() == []
+    assert sorted(task_state.armed) == numbers[:-1]
+
+
+def test_reconcile_reports_drifted_topics(task_state, add_task):
+    task_number = add_task(1)
+    task_state._record('task_published', task_number=task_number, thread_id=10, message_id=20)
+    task_state.try_set_resolved(task_number, True)
+
+    assert task_state.reconcile() == [task_number]
+    task_state.set_topic_resolved(task_number, True)
+    assert task_state.reconcile() == []
+
+
+def test_background_passes_do_not_decode_untouched_tasks(task_state, add_task):
+    numbers = [add_task(1) for _ in range(4)]
+    task_state.start_timers(numbers[0])
+    task_state.try_set_resolved(numbers[1], True)
+    task_state._record('task_updated', task_number=numbers[1], fields={'resolved_at': "2000-01-01T00:00:00"})
+    # Перезапуск: задачи снова лежат в снимке строками
+    task_state.store.compact()
+    task_state.store.close()
+    task_state.store.load()
+    assert task_state.tasks.undecoded == 4
+
+    task_state.reconcile()
+    task_state.collect_due_timers()
+    assert task_state.archive_resolved() == 1
+
+    # Разобраны только задача с таймером и ушедшая в архив
+    assert task_state.tasks.undecoded == 2
+    assert numbers[1] not in task_state.tasks
@@ -0,0 +1,57 @@
+import records
+from config import RECORD_SHARED_VALUES_CACHE_SIZE
+from records import TaskRecord
+from tasks import TaskState, STATUS_MAP
+
+# Задача из файла состояния до TaskRecord: статусы по имени, без responder_names
+LEGACY_TASK = {
+    'client_name': "Клиент",
+    'urgency': "срочно",
+    'what_to_do': "сделать",
+    'goal': "цель",
+    'client_pp': "пп",
+    'equipment': "оборудование",
+    'cost_and_hours': "100",
+    'contact_person': "контакт",
+    'photo': None,
+    'sender_name': "Отправитель",
+    'sender_id': 1,
+    'is_resolved': False,
+    'status': {"Иван": STATUS_MAP['take'], "Пётр": STATUS_MAP['no_competence']},
+    'responded_users': [111, 222],
+}
+
+
+def test_legacy_status_replaced_by_id_keyed_update():
+    task = TaskRecord.from_dict(LEGACY_TASK)
+    task.set_status(111, "Иван", STATUS_MAP['cant_take'])
+
+    assert list(task.status.values()) == [("Иван", STATUS_MAP['cant_take']),
+                                          ("Пётр", STATUS_MAP['no_competence'])]
+    assert 111 in task.status
+    message = TaskState._render_task_message(1, task, with_status=True)
+    assert message.count("Иван") == 1
+    assert f"• Иван — {STATUS_MAP['cant_take']}" in message
+
+
+def test_legacy_status_merge_survives_round_trip():
+    task = TaskRecord.from_dict(LEGACY_TASK)
+    task.set_status(111, "Иван", STATUS_MAP['cant_take'])
+    task = TaskRecord.from_dict(task.to_dict())
+    task.set_status(None, "Сергей", STATUS_MAP['take'], responded=False)
+    task.set_status(111, "Иван", STATUS_MAP['take'])
+
+    assert sorted(task.status.values()) == [("Иван", STATUS_MAP['take']),
+                                            ("Пётр", STATUS_MAP['no_competence']),
+                                            ("Сергей", STATUS_MAP['take'])]
+    assert task.responded == {111, 222}
+
+
+def test_shared_values_are_bounded():
+    for n in range(RECORD_SHARED_VALUES_CACHE_SIZE + 100):
+        TaskRecord.from_dict(dict(LEGACY_TASK, urgency=f"срочность {n}", sender_name=f"Отправитель {n}"))
+
+    assert len(records._shared) <= RECORD_SHARED_VALUES_CACHE_SIZE
+    first = TaskRecord.from_dict(dict(LEGACY_TASK, urgency="до пятницы"))
+    second = TaskRecord.from_dict(dict(LEGACY_TASK, urgency="до пятницы"))
+    assert first.urgency is second.urgency
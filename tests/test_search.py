@@ -0,0 +1,24 @@
+from search import SearchIndex
+from tasks import FIND_USAGE
+
+
+def test_search_query_without_words_matches_nothing():
+    index = SearchIndex()
+    index.add(1, {'client_name': "Альфа", 'sender_id': 1})
+    index.add(2, {'client_name': "Бета", 'sender_id': 2})
+
+    assert index.search("") == ([2, 1], 2)
+    assert index.search("A") == ([], 0)
+    assert index.search("?!") == ([], 0)
+    assert index.search("альф") == ([1], 1)
+
+
+def test_find_without_words_or_filters_shows_usage(task_state, add_task):
+    add_task(1, client_name="Альфа")
+    add_task(2, client_name="Бета")
+
+    assert task_state.find_tasks("", 1) == FIND_USAGE
+    assert task_state.find_tasks("A", 1) == FIND_USAGE
+    assert task_state.find_tasks("A open", 1) == "Ничего не найдено."
+    assert task_state.find_tasks("open", 1).startswith("Найдено задач: 2")
+    assert task_state.find_tasks("бета", 1).startswith("Найдено задач: 1")
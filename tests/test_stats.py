@@ -0,0 +1,17 @@
+from tasks import STATUS_MAP, user_profiles
+
+
+def test_stats_names_receivers_without_cached_profiles(task_state, add_task):
+    task_number = add_task(1)
+    task_state.set_status(task_number, "Иван Петров", STATUS_MAP['take'], user_id=111)
+    task_state.set_status(task_number, "Пётр", STATUS_MAP['cant_take'], user_id=222)
+    # Перезапуск: кэш профилей пуст, а счётчики читаются из снимка
+    task_state.store.compact()
+    task_state.store.close()
+    task_state.store.load()
+    assert user_profiles.get(111) is None
+
+    report = task_state.stats_report()
+    assert "Иван Петров: 1," in report
+    assert "Пётр: 1," in report
+    assert "id 111" not in report
@@ -0,0 +1,163 @@
+import json
+import os
+import shutil
+import threading
+
+import pytest
+
+import storage
+from storage import JournalStateStore, SqliteStateStore
+
+
+@pytest.fixture
+def open_store(tmp_path):
+    """open_store(**kwargs) — JournalStateStore в tmp_path после load(); закрывается после теста."""
+    stores = []
+
+    def open_(**kwargs):
+        store = JournalStateStore(str(tmp_path / 'task_state.json'), **kwargs)
+        store.load()
+        stores.append(store)
+        return store
+    yield open_
+    for store in stores:
+        store.close()
+
+
+def create(store, task_number, **fields):
+    store.record('task_created', task_number=task_number,
+                 task=dict({'client_name': f"Клиент {task_number}", 'is_resolved': False}, **fields))
+
+
+def test_compaction_runs_off_the_writing_thread(open_store, monkeypatch):
+    compacted = threading.Event()
+    threads = []
+    compact = JournalStateStore.compact
+
+    def recording_compact(self):
+        threads.append(threading.current_thread().name)
+        compact(self)
+        compacted.set()
+    monkeypatch.setattr(JournalStateStore, 'compact', recording_compact)
+
+    store = open_store(compact_every=3)
+    for task_number in (1, 2, 3):
+        create(store, task_number)
+
+    assert compacted.wait(5)
+    assert threads == ['state-compactor']
+    store.record('task_updated', task_number=2, fields={'urgency': "срочно"})
+    store.close()
+
+    reloaded = open_store()
+    assert sorted(reloaded.tasks) == [1, 2, 3]
+    assert reloaded.tasks[2]['urgency'] == "срочно"
+    assert reloaded.task_counter == 4
+
+
+def test_snapshot_keeps_untouched_tasks_verbatim(open_store):
+    store = open_store()
+    for task_number in (1, 2):
+        create(store, task_number)
+    store.compact()
+    store.close()
+
+    store = open_store()
+    assert store.tasks[1]['client_name'] == "Клиент 1"  # прочитана, но не изменена
+    store.record('task_updated', task_number=2, fields={'goal': "цель"})
+    tasks, changed = store.tasks.snapshot()
+
+    assert [task_number for task_number, _ in tasks] == [1]
+    assert list(changed) == [2]
+    changed[2].goal = "изменена копия"
+    assert store.tasks[2]['goal'] == "цель"
+
+
+def test_replay_after_interrupted_compactions(open_store, monkeypatch):
+    store = open_store()
+    create(store, 1)
+    create(store, 2)
+
+    def crash(*args, **kwargs):
+        raise OSError("disk full")
+    # Снимок не записан дважды: журнал оба раза ушёл в .old, записи между попытками — туда же
+    monkeypatch.setattr(storage.gzip, 'GzipFile', crash)
+    store.compact()
+    store.record('resolved', task_number=1, value=True, at="2024-01-02T00:00:00")
+    store.compact()
+    create(store, 3)
+    store.close()
+    monkeypatch.undo()
+    assert os.path.exists(store.journal_path + '.old')
+    assert not os.path.exists(store.path)
+
+    reloaded = open_store()
+    assert sorted(reloaded.tasks) == [1, 2, 3]
+    assert reloaded.tasks[1]['is_resolved'] is True
+    assert reloaded.stats.get('', 'open') == 2
+
+
+def test_replay_skips_records_already_in_snapshot(open_store):
+    store = open_store()
+    create(store, 1)
+    create(store, 2)
+    shutil.copy(store.journal_path, store.journal_path + '.copy')
+    store.compact()
+    create(store, 3)
+    store.close()
+    # Процесс упал после записи снимка, но до удаления .old
+    os.replace(store.journal_path + '.copy', store.journal_path + '.old')
+
+    reloaded = open_store()
+    assert sorted(reloaded.tasks) == [1, 2, 3]
+    assert reloaded.stats.get('', 'open') == 3
+    assert reloaded.task_counter == 4
+
+
+def test_torn_journal_tail_is_dropped(open_store):
+    store = open_store()
+    create(store, 1)
+    store.close()
+    with open(store.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 2, "op": "task_crea')
+
+    store = open_store()
+    assert sorted(store.tasks) == [1]
+    # Записи после обрыва не должны потеряться при следующем запуске
+    create(store, 2)
+    store.close()
+
+    reloaded = open_store()
+    assert sorted(reloaded.tasks) == [1, 2]
+
+
+def test_sqlite_store_imports_existing_json_state(tmp_path):
+    # Статусы по имени, как до TaskRecord
+    legacy_task = {'client_name': "Клиент", 'sender_id': 7, 'is_resolved': False,
+                   'status': {"Иван": "готов взять задачу"}, 'responded_users': [111]}
+    json_path = str(tmp_path / 'task_state.json')
+    # task_state.json в исходном формате (до журнала) и журнал поверх него
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'task_counter': 3,
+                   'tasks': {'1': legacy_task, '2': dict(legacy_task, is_resolved=True)},
+                   'threads': {'1': 10, '2': 20},
+                   'message_ids': {'1': 11, '2': 21},
+                   'pending_tasks': {'5': {'client_name': "Черновик"}}}, f, ensure_ascii=False)
+    legacy = JournalStateStore(json_path)
+    legacy.load()
+    create(legacy, 3)
+    legacy.record('task_published', task_number=3, thread_id=30, message_id=31)
+    legacy.close()
+
+    for _ in range(2):  # второй запуск не импортирует заново
+        store = SqliteStateStore(str(tmp_path / 'task_state.db'), migrate_from=json_path)
+        store.load()
+        assert sorted(store.tasks) == [1, 2, 3]
+        assert store.tasks[1] == legacy.tasks[1]
+        assert store.tasks[2]['is_resolved'] is True
+        assert dict(store.threads) == {1: 10, 2: 20, 3: 30}
+        assert dict(store.message_ids) == {1: 11, 2: 21, 3: 31}
+        assert dict(store.pending_tasks) == {5: {'client_name': "Черновик"}}
+        assert store.task_counter == 4
+        assert store.stats.get('', 'open') == 2
+        store.close()
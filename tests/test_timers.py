@@ -0,0 +1,32 @@
+import re
+
+from config import INFO_CHAT_ID
+from tasks import MAX_MESSAGE_LENGTH, TIMER_FIELDS, reminder_texts, task_receivers
+
+
+def test_send_due_sends_one_reminder_per_receiver(task_state, add_task):
+    first, second = add_task(1), add_task(1)
+    receivers = task_receivers(task_state.get_task_snapshot(first))
+    for task_number in (first, second):
+        task_state.start_timers(task_number)
+
+    task_state.send_due({'reminder_at': [first, second], 'notify_at': [first]},
+                        [(first, ["Иван"])])
+
+    reminders = [kwargs for method, kwargs in task_state.outbox.queued if kwargs['chat_id'] != INFO_CHAT_ID]
+    assert sorted(kwargs['chat_id'] for kwargs in reminders) == sorted(receivers)
+    assert all(f"#{first}, #{second}" in kwargs['text'] for kwargs in reminders)
+    notices = [kwargs['text'] for method, kwargs in task_state.outbox.queued if kwargs['chat_id'] == INFO_CHAT_ID]
+    assert len(notices) == 1 and "Иван" in notices[0]
+    assert task_state.collect_due_timers() == {field: [] for field in TIMER_FIELDS}
+    assert task_state.get_task_snapshot(second)['notify_at']
+
+
+def test_long_reminder_digest_is_split():
+    task_numbers = list(range(1, 2001))
+    texts = reminder_texts(task_numbers)
+
+    assert len(texts) > 1
+    assert all(len(text) <= MAX_MESSAGE_LENGTH for text in texts)
+    assert [int(n) for text in texts for n in re.findall(r"#(\d+)", text)] == task_numbers
+    assert reminder_texts([7]) == ["⏰ Напоминание! Пожалуйста, ответьте на задачу #7."]
@@ -0,0 +1,65 @@
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from webhook import MAX_BODY_SIZE, make_handler
+
+PATH = '/telegram-webhook'
+SECRET = "s3cret_token"
+
+
+class FakeBot:
+    def __init__(self):
+        self.updates = []
+        self.processed = threading.Event()
+
+    def process_new_updates(self, updates):
+        self.updates.extend(updates)
+        self.processed.set()
+
+
+@pytest.fixture
+def webhook():
+    """(бот, post(body, **заголовки) -> код ответа) для сервера на свободном порту."""
+    bot = FakeBot()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(bot, PATH, SECRET))
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+
+    def post(body=b"", headers=None):
+        conn = http.client.HTTPConnection('127.0.0.1', server.server_address[1], timeout=5)
+        conn.putrequest('POST', PATH)
+        for name, value in dict({'X-Telegram-Bot-Api-Secret-Token': SECRET.encode()},
+                                **(headers or {})).items():
+            conn.putheader(name, value)
+        conn.endheaders(body)
+        status = conn.getresponse().status
+        conn.close()
+        return status
+    yield bot, post
+    server.shutdown()
+    server.server_close()
+
+
+def test_accepts_update(webhook):
+    bot, post = webhook
+    body = json.dumps({'update_id': 1}).encode()
+    assert post(body, {'Content-Length': str(len(body))}) == 200
+    # Ответ уходит до обработки обновления
+    assert bot.processed.wait(5)
+    assert [update.update_id for update in bot.updates] == [1]
+
+
+@pytest.mark.parametrize('length', ["abc", "-5", "0", str(MAX_BODY_SIZE + 1)])
+def test_rejects_bad_content_length(webhook, length):
+    bot, post = webhook
+    assert post(b"{}", {'Content-Length': length}) == 400
+    assert bot.updates == []
+
+
+def test_rejects_wrong_secret(webhook):
+    bot, post = webhook
+    assert post(b"{}", {'Content-Length': "2", 'X-Telegram-Bot-Api-Secret-Token': b"x"}) == 403
@@ -0,0 +1,77 @@
+"""
+Приём обновлений через webhook вместо long polling.
+
+Локальная проверка — отправить записанный update POST-запросом:
+
+    curl -X POST http://127.0.0.1:8443/telegram-webhook \
+         -H 'Content-Type: application/json' \
+         -H 'X-Telegram-Bot-Api-Secret-Token: <WEBHOOK_SECRET>' \
+         -d @update.json
+"""
+import hmac
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 1024 * 1024
+
+
+def make_handler(bot, path, secret_token=None):
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != path:
+                return self._reply(404)
+            # Сравнение за постоянное время: по задержке ответа токен не подобрать
+            if secret_token and not hmac.compare_digest(
+                    self.headers.get('X-Telegram-Bot-Api-Secret-Token', '').encode(), secret_token.encode()):
+                return self._reply(403)
+
+            try:
+                length = int(self.headers.get('Content-Length') or 0)
+            except ValueError:
+                return self._reply(400)
+            if length <= 0 or length > MAX_BODY_SIZE:
+                return self._reply(400)
+            try:
+                update = types.Update.de_json(json.loads(self.rfile.read(length)))
+            except (ValueError, KeyError, TypeError) as e:
+                logger.error(f"Bad webhook payload: {e}")
+                return self._reply(400)
+
+            # Telegram ждёт быстрый ответ: обработчики выполняются в пуле потоков TeleBot
+            self._reply(200)
+            try:
+                bot.process_new_updates([update])
+            except Exception as e:
+                logger.error(f"Error processing update {update.update_id}: {e}")
+
+        def _reply(self, code):
+            self.send_response(code)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            logger.debug(format % args)
+
+    return WebhookHandler
+
+
+def run_webhook(bot, host, port, path, secret_token=None, public_url=None):
+    """
+    Запускает HTTP-сервер для webhook. Если указан public_url, регистрирует
+    его в Telegram (TLS при этом обычно завершается на reverse proxy).
+    """
+    if public_url:
+        bot.set_webhook(url=public_url.rstrip('/') + path, secret_token=secret_token)
+        logger.info(f"Webhook registered at {public_url}{path}")
+
+    server = ThreadingHTTPServer((host, port), make_handler(bot, path, secret_token))
+    logger.info(f"Webhook server listening on {host}:{port}{path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()